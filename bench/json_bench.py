@@ -0,0 +1,95 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Benchmark json decoding and encoding of springnote pages, with each codec
+
+    * loads:     page list payload decoded
+    * dumps:     page list encoded again
+    * from_json: Page.from_json, building pages from the payload
+
+payloads are lists of pages shaped as springnote.com returns them, with
+korean sources. every registered codec is measured: bundled simplejson
+(in C if its speedups are built with springnote.py --build-speedups, 
+and in python) and json of python 2.6+. the codec springnote chose when 
+imported, the first registered (one in C) unless SPRINGNOTE_JSON says 
+otherwise, is marked with *.
+
+    python bench/json_bench.py [--pages 20,200,2000]
+'''
+import os, sys
+# ../
+PATH    = os.path.dirname(__file__)
+HOMEDIR = os.path.abspath(os.path.join(PATH, os.path.pardir))
+sys.path.append(HOMEDIR)
+
+import time
+from optparse import OptionParser
+
+import springnote
+
+# cpu time of the process, less disturbed by other processes than wall time
+if sys.platform == 'win32': timer = time.time
+else:                       timer = time.clock
+
+SOURCE = u'<p>스프링노트는 웹에서 쓰는 노트입니다. 페이지를 만들고 고치세요.</p>\n' * 8
+
+def page_list(count):
+    ''' `count' pages, as decoded from GET /pages.json '''
+    pages = []
+    for id in xrange(1, count + 1):
+        pages.append({'page': {
+            'rights': None,
+            'source': SOURCE,
+            'creator': 'http://deepblue.myid.net/',
+            'date_created': '2007/10/26 05:30:08 +0000',
+            'contributor_modified': 'http://deepblue.myid.net/',
+            'date_modified': '2008/01/08 10:55:36 +0000',
+            'relation_is_part_of': id // 10 or None,
+            'identifier': id,
+            'tags': 'test,bench',
+            'title': u'페이지 %d' % id,
+        }})
+    return pages
+
+def seconds(function, *args):
+    ''' best of three runs '''
+    best = None
+    for i in range(3):
+        started = timer()
+        function(*args)
+        elapsed = timer() - started
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def run(counts):
+    chosen = springnote.json
+    print springnote.json_backend_info()
+    print
+    print '%-18s %-10s %7s %9s %10s' % ('codec', 'case', 'pages', 'size(KB)', 'ms')
+    auth = springnote.Springnote()
+    try:
+        for count in counts:
+            structure = page_list(count)
+            data = chosen.dumps(structure, ensure_ascii=False).encode('utf-8')
+            size = len(data) / 1024.0
+            for codec in springnote.json_codecs:
+                springnote.json = codec
+                name = codec.name + (codec is chosen and ' *' or '')
+                for case, function, arg in [
+                        ('loads',     codec.loads, data),
+                        ('dumps',     lambda obj: codec.dumps(obj, ensure_ascii=False), structure),
+                        ('from_json', lambda data: springnote.Page.from_json(data, auth), data)]:
+                    print '%-18s %-10s %7d %9.1f %10.1f' % (name, case, count, size, 
+                                                            seconds(function, arg) * 1000)
+            print
+    finally:
+        springnote.json = chosen
+
+if __name__ == '__main__':
+    parser = OptionParser(usage="%prog [--pages 20,200,2000]")
+    parser.add_option('--pages', default='20,200,2000',
+                      help='numbers of pages in a payload, separated by comma')
+    options, args = parser.parse_args()
+    run([int(count) for count in options.pages.split(',')])
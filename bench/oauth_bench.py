@@ -0,0 +1,156 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Benchmark OAuth signing, offline
+
+    * nonce and timestamp generation
+    * parameter normalization
+    * HMAC-SHA1 signing
+    * header serialization
+    * Springnote.oauth_request, as a whole
+
+each case is run with a few, some and many parameters, with ascii and korean
+query values. ops/sec is the best of a few rounds, and objects/op is the
+number of gc-tracked objects an operation leaves alive, counted while the
+garbage collector is paused.
+
+    python bench/oauth_bench.py            # compare with the baseline
+    python bench/oauth_bench.py --save     # store the result as baseline
+'''
+import os, sys
+# ../
+PATH    = os.path.dirname(__file__)
+HOMEDIR = os.path.abspath(os.path.join(PATH, os.path.pardir))
+sys.path.append(HOMEDIR)
+
+import gc, time
+from optparse import OptionParser
+
+import springnote
+from springnote import oauth
+
+BASELINE  = os.path.join(PATH, 'oauth_baseline.json')
+URL       = "http://api.springnote.com/pages.json"
+CONSUMER  = oauth.OAuthConsumer('CONSUMER_KEY', 'CONSUMER_SECRET')
+TOKEN     = oauth.OAuthToken('ACCESS_KEY', 'ACCESS_SECRET')
+SIGNATURE = oauth.OAuthSignatureMethod_HMAC_SHA1()
+
+# korean search, as in Page.search(q=..)
+KOREAN = u'스프링노트 검색어 한글'
+
+def parameters(count, korean=False):
+    ''' query parameters of a resource request. q is a korean search if asked '''
+    params = {'domain': 'jangxyz'}
+    if korean:
+        params['q'] = KOREAN
+    for i in range(count - len(params)):
+        params['param%02d' % i] = 'value %d' % i
+    return params
+
+def signed_request(params):
+    request = oauth.OAuthRequest.from_consumer_and_token(
+        CONSUMER, TOKEN, "GET", URL, dict(params))
+    request.sign_request(SIGNATURE, CONSUMER, TOKEN)
+    return request
+
+def cases():
+    ''' (name, function) to benchmark '''
+    yield 'generate_nonce',     oauth.generate_nonce
+    yield 'generate_timestamp', oauth.generate_timestamp_string
+    sn = springnote.Springnote(access_token=(TOKEN.key, TOKEN.secret))
+    for count in (2, 10, 50):
+        for korean in (False, True):
+            params  = parameters(count, korean)
+            suffix  = '[%d%s]' % (count, korean and ',ko' or '')
+            request = signed_request(params)
+            yield 'normalize' + suffix, request.get_normalized_parameters
+            yield 'sign'      + suffix, \
+                lambda request=request: SIGNATURE.build_signature(request, CONSUMER, TOKEN)
+            yield 'to_header' + suffix, request.to_header
+            yield 'oauth_request' + suffix, \
+                lambda params=params: sn.oauth_request("GET", URL, params)
+
+# cpu time of the process, less disturbed by other processes than wall time
+if sys.platform == 'win32': timer = time.time
+else:                       timer = time.clock
+
+def ops_per_sec(function, rounds=5, duration=0.2):
+    ''' best rate of function calls in a few rounds of `duration' seconds '''
+    best = 0
+    for i in range(rounds):
+        count, started = 0, timer()
+        while True:
+            for j in xrange(100):
+                function()
+            count += 100
+            elapsed = timer() - started
+            if elapsed >= duration:
+                break
+        best = max(best, count / elapsed)
+    return best
+
+def objects_per_op(function, times=1000):
+    ''' gc-tracked objects left alive by each call, keeping what it returns '''
+    results = []
+    gc.collect()
+    gc.disable()
+    try:
+        before = len(gc.get_objects())
+        for i in xrange(times):
+            results.append(function())
+        after = len(gc.get_objects())
+    finally:
+        gc.enable()
+    return float(after - before) / times
+
+def run():
+    ''' returns {name: {'ops': .., 'objects': ..}} '''
+    result = {}
+    for name, function in cases():
+        function() # warm up caches
+        result[name] = {'ops': ops_per_sec(function), 'objects': objects_per_op(function)}
+    return result
+
+def report(result, baseline=None, threshold=0.3):
+    ''' print result compared with baseline, and returns names of the cases
+    slower than baseline by more than threshold '''
+    regressions = []
+    print '%-24s %12s %10s %10s' % ('case', 'ops/sec', 'objects/op', 'vs base')
+    for name in sorted(result):
+        ops, objects = result[name]['ops'], result[name]['objects']
+        compared = ''
+        if baseline and name in baseline:
+            ratio = ops / baseline[name]['ops']
+            compared = '%.2fx' % ratio
+            if ratio < 1 - threshold:
+                compared += ' !'
+                regressions.append(name)
+        print '%-24s %12.0f %10.1f %10s' % (name, ops, objects, compared)
+    return regressions
+
+if __name__ == '__main__':
+    parser = OptionParser(usage="%prog [--save] [--threshold RATIO]")
+    parser.add_option('--save', action='store_true', default=False,
+                      help='store the result as the new baseline')
+    parser.add_option('--threshold', type='float', default=0.3,
+                      help='slowdown from baseline reported as regression')
+    options, args = parser.parse_args()
+
+    baseline = None
+    if os.path.exists(BASELINE):
+        baseline = springnote.json.loads(open(BASELINE).read())
+
+    result      = run()
+    regressions = report(result, baseline, options.threshold)
+
+    if options.save:
+        file = open(BASELINE, 'w')
+        try:
+            file.write(springnote.json.dumps(result, indent=2, sort_keys=True))
+        finally:
+            file.close()
+        print 'baseline saved to', BASELINE
+    elif regressions:
+        print '%d case(s) slower than baseline: %s' % (len(regressions), ', '.join(regressions))
+        sys.exit(1)
@@ -1,10 +1,17 @@
 import cgi
 import urllib
 import time
-import random
+import os
+import binascii
+import threading
 import urlparse
 import hmac
 import base64
+try:
+    import hashlib # 2.5
+    sha1 = hashlib.sha1
+except ImportError:
+    import sha as sha1 # deprecated
 
 VERSION = '1.0' # Hi Blaine!
 #HTTP_METHOD = 'GET'
@@ -25,15 +32,63 @@ def escape(s):
     # escape '/' too
     return urllib.quote(s, safe='~')
 
+# escape a parameter value, which is encoded in utf-8 if it is unicode
+def escape_value(v):
+    if isinstance(v, unicode):
+        return escape(v.encode('utf-8'))
+    return escape(str(v))
+
+# util function: merge two sorted lists into one
+def merge_sorted(a, b):
+    merged, i, j = [], 0, 0
+    while i < len(a) and j < len(b):
+        if b[j] < a[i]:
+            merged.append(b[j])
+            j += 1
+        else:
+            merged.append(a[i])
+            i += 1
+    merged.extend(a[i:])
+    merged.extend(b[j:])
+    return merged
+
 # util function: current timestamp
 # seconds since epoch (UTC)
 def generate_timestamp():
     return int(time.time())
 
+# util function: current timestamp as a string, made once a second
+_timestamp = (None, None)
+def generate_timestamp_string():
+    global _timestamp
+    now = int(time.time())
+    second, string = _timestamp
+    if second != now:
+        second, string = _timestamp = now, str(now)
+    return string
+
 # util function: nonce
-# pseudorandom number
-def generate_nonce(length=8):
-    return ''.join(str(random.randint(0, 9)) for i in range(length))
+# hex digits of random bytes from os.urandom, which are read ahead in a
+# buffer. the buffer is read again in a forked process, so that processes
+# never share nonces
+NONCE_BUFFER_SIZE = 4096
+_nonce_lock = threading.Lock()
+_nonce_buffer = {'pid': None, 'bytes': '', 'offset': 0}
+def generate_nonce(length=16):
+    size = (length + 1) // 2
+    _nonce_lock.acquire()
+    try:
+        buffer = _nonce_buffer
+        offset = buffer['offset']
+        if buffer['pid'] != os.getpid() or offset + size > len(buffer['bytes']):
+            buffer['pid']   = os.getpid()
+            buffer['bytes'] = os.urandom(max(NONCE_BUFFER_SIZE, size))
+            offset = 0
+        buffer['offset'] = offset + size
+        random_bytes = buffer['bytes'][offset:offset + size]
+    finally:
+        _nonce_lock.release()
+    return binascii.hexlify(random_bytes)[:length]
 
 # OAuthConsumer is a data type that represents the identity of the Consumer
 # via its shared secret with the Service Provider.
@@ -93,10 +148,18 @@ class OAuthRequest(object):
     http_url = None
     version = VERSION
 
+    # parameters which stay the same for a consumer and token. their escaped
+    # pairs are sorted once and kept in _static_pairs, keyed by the values
+    static_parameters = ('oauth_consumer_key', 'oauth_token', 
+                         'oauth_signature_method', 'oauth_version')
+    _static_pairs = {}
+    max_static_pairs = 1000
+
     def __init__(self, http_method=HTTP_METHOD, http_url=None, parameters=None):
         self.http_method = http_method
         self.http_url = http_url
         self.parameters = parameters or {}
+        self._escaped = {} # key => (value, escaped key, escaped value)
 
     def set_parameter(self, parameter, value):
         self.parameters[parameter] = value
@@ -119,18 +182,28 @@ class OAuthRequest(object):
                 parameters[k] = v
         return parameters
 
+    # escaped pairs of key and value for each parameter. each is escaped once
+    # and kept, until the value of the parameter is changed
+    def get_escaped_parameters(self):
+        escaped, pairs = self._escaped, {}
+        for k, v in self.parameters.iteritems():
+            entry = escaped.get(k)
+            if entry is None or entry[0] is not v:
+                entry = escaped[k] = (v, escape_value(k), escape_value(v))
+            pairs[k] = entry[1:]
+        return pairs
+
     # serialize as a header for an HTTPAuth request
     def to_header(self, realm=''):
-        auth_header = 'OAuth realm="%s"' % realm
         # add the oauth parameters
-        if self.parameters:
-            for k, v in self.parameters.iteritems():
-                auth_header += ', %s="%s"' % (k, escape(str(v)))
+        pairs = self.get_escaped_parameters().itervalues()
+        auth_header = ', '.join(['OAuth realm="%s"' % realm] + 
+                                ['%s="%s"' % pair for pair in pairs])
         return {'Authorization': auth_header}
 
     # serialize as post data for a POST request
     def to_postdata(self):
-        return '&'.join('%s=%s' % (escape(str(k)), escape(str(v))) for k, v in self.parameters.iteritems())
+        return '&'.join(['%s=%s' % pair for pair in self.get_escaped_parameters().itervalues()])
 
     # serialize as a url for a GET request
     def to_url(self):
@@ -139,16 +212,21 @@ class OAuthRequest(object):
     # return a string that consists of all the parameters that need to be signed
     def get_normalized_parameters(self):
         params = self.parameters
-        try:
-            # exclude the signature if it exists
-            del params['oauth_signature']
-        except:
-            pass
-        key_values = params.items()
-        # sort lexicographically, first after key, then after value
-        key_values.sort()
-        # combine key value pairs in string and escape
-        return '&'.join('%s=%s' % (escape(str(k)), escape(str(v))) for k, v in key_values)
+        escaped = self.get_escaped_parameters()
+        # static parameters are escaped and sorted once, and the rest of 
+        # them, sorted lexicographically, are merged into them
+        static = tuple((k, params[k]) for k in self.static_parameters if k in params)
+        static_pairs = OAuthRequest._static_pairs.get(static)
+        if static_pairs is None:
+            static_pairs = sorted(escaped[k] for k, v in static)
+            if len(OAuthRequest._static_pairs) >= self.max_static_pairs:
+                OAuthRequest._static_pairs.clear()
+            OAuthRequest._static_pairs[static] = static_pairs
+        # exclude the signature if it exists
+        pairs = sorted(pair for k, pair in escaped.iteritems() 
+                        if k not in self.static_parameters and k != 'oauth_signature')
+        # combine key value pairs in string
+        return '&'.join(['%s=%s' % pair for pair in merge_sorted(static_pairs, pairs)])
 
     # just uppercases the http method
     def get_normalized_http_method(self):
@@ -211,7 +289,7 @@ class OAuthRequest(object):
 
         defaults = {
             'oauth_consumer_key': oauth_consumer.key,
-            'oauth_timestamp': generate_timestamp(),
+            'oauth_timestamp': generate_timestamp_string(),
             'oauth_nonce': generate_nonce(),
             'oauth_version': OAuthRequest.version,
         }
@@ -476,9 +554,32 @@ class OAuthSignatureMethod(object):
         return built == signature
 
 class OAuthSignatureMethod_HMAC_SHA1(OAuthSignatureMethod):
+    # escaped signing key and hmac object keyed with it, for each pair of
+    # consumer secret and token secret
+    max_keys = 1000
+
+    def __init__(self):
+        self._keys = {}
 
     def get_name(self):
         return 'HMAC-SHA1'
+
+    def get_signing_key(self, consumer, token):
+        # -> str key, hmac object keyed with it
+        secrets = (consumer.secret, token and token.secret)
+        try:
+            return self._keys[secrets]
+        except KeyError:
+            pass
+        key = '%s&' % escape(consumer.secret)
+        if token:
+            key += escape(token.secret)
+        if len(self._keys) >= self.max_keys:
+            self._keys.clear()
+        # returned as built, as another thread may clear the cache meanwhile
+        signing_key = key, hmac.new(key, digestmod=sha1)
+        self._keys[secrets] = signing_key
+        return signing_key
         
     def build_signature_base_string(self, oauth_request, consumer, token):
         sig = (
@@ -487,9 +588,7 @@ class OAuthSignatureMethod_HMAC_SHA1(OAuthSignatureMethod):
             escape(oauth_request.get_normalized_parameters()),
         )
 
-        key = '%s&' % escape(consumer.secret)
-        if token:
-            key += escape(token.secret)
+        key, keyed = self.get_signing_key(consumer, token)
         raw = '&'.join(sig)
         return key, raw
 
@@ -497,13 +596,9 @@ class OAuthSignatureMethod_HMAC_SHA1(OAuthSignatureMethod):
         # build the base signature string
         key, raw = self.build_signature_base_string(oauth_request, consumer, token)
 
-        # hmac object
-        try:
-            import hashlib # 2.5
-            hashed = hmac.new(key, raw, hashlib.sha1)
-        except:
-            import sha # deprecated
-            hashed = hmac.new(key, raw, sha)
+        # hmac object, copied from the one already keyed
+        hashed = self.get_signing_key(consumer, token)[1].copy()
+        hashed.update(raw)
 
         # calculate the digest base 64
         return base64.b64encode(hashed.digest())
@@ -12,18 +12,262 @@ __version__ = 0.8
 
 import env
 import oauth, sys, types
-import re, time
+import re, time, threading, random, rfc822
 from datetime import datetime, timedelta
-import httplib, urllib, socket, os.path
+import httplib, urllib, socket, os.path, Queue, StringIO, zlib, copy
+import imp, tempfile, shutil
 
-# try importing json: simplejson -> json -> FAIL
+# file lock is used to share rate limit among processes, if available
 try:
-    import simplejson as json
+    import fcntl
 except ImportError:
+    fcntl = None
+
+# simplejson bundled in lib/, with its C speedups
+BUNDLED_SIMPLEJSON = os.path.join(env.LIBDIR, 'simplejson')
+
+def has_json_speedups(directory=BUNDLED_SIMPLEJSON):
+    ''' whether _speedups of simplejson in directory is built '''
+    for suffix, mode, kind in imp.get_suffixes():
+        if kind == imp.C_EXTENSION and \
+                os.path.exists(os.path.join(directory, '_speedups' + suffix)):
+            return True
+    return False
+
+def build_json_speedups(directory=BUNDLED_SIMPLEJSON):
+    ''' build _speedups of simplejson in directory with the C compiler python
+    is built with, so that json is scanned and encoded in C once it is 
+    imported. returns True if it is built. nothing is built without a 
+    compiler, or if directory is not writable. 
+
+    this is not done on import, but asked once for a checkout:
+
+        python springnote.py --build-speedups
+    '''
+    source = os.path.join(directory, '_speedups.c')
+    if not os.path.exists(source) or not os.access(directory, os.W_OK):
+        return False
     try:
-        import json
+        from distutils import sysconfig
+        from distutils.ccompiler import new_compiler
+        from distutils.errors import DistutilsError, CCompilerError
     except ImportError:
-        sys.exit("cannot find json library. try installing simplejson")
+        return False
+
+    target = os.path.join(directory, '_speedups' + sysconfig.get_config_var('SO'))
+    partial  = '%s.%d' % (target, os.getpid())
+    build_dir = tempfile.mkdtemp()
+    try:
+        try:
+            compiler = new_compiler()
+            sysconfig.customize_compiler(compiler)
+            objects = compiler.compile([source], output_dir=build_dir,
+                                       include_dirs=[sysconfig.get_python_inc()])
+            compiler.link_shared_object(objects, partial)
+            os.rename(partial, target) # other processes see it built, or not
+        finally:
+            shutil.rmtree(build_dir, True)
+            if os.path.exists(partial):
+                os.remove(partial)
+    except (DistutilsError, CCompilerError, OSError, IOError):
+        return False
+    return True
+
+# json libraries: bundled simplejson, and json of python 2.6+
+try:
+    import simplejson
+except ImportError:
+    simplejson = None
+try:
+    import json as stdlib_json
+except ImportError:
+    stdlib_json = None
+if stdlib_json is simplejson: # python 2.5, without json but simplejson
+    stdlib_json = None
+
+
+class JsonCodec(object):
+    ''' json library resources are decoded and encoded with. 
+
+    loads(data, object_hook=None) and dumps(obj, ensure_ascii=True, ..) are
+    called as those of simplejson. module is the library it runs on, if any,
+    and pure_python tells the C speedups of the module are not used '''
+    def __init__(self, name, loads, dumps, module=None, pure_python=False):
+        self.name        = name
+        self.loads       = loads
+        self.dumps       = dumps
+        self.module      = module
+        self.pure_python = pure_python
+
+    def __repr__(self):
+        return '<JsonCodec %s>' % self.name
+
+    def info(self):
+        ''' the library, and whether its scanner, string scanner, encoder and 
+        string encoder are the ones in C or in python. 'unknown' for a codec
+        not running on a module '''
+        info = {'codec': self.name, 'module': None, 'version': None, 'path': None}
+        parts = ['scanner', 'scanstring', 'encoder', 'encode_basestring_ascii']
+        if self.module is None:
+            for part in parts: info[part] = 'unknown'
+            return info
+        module  = self.module
+        decoder = sys.modules.get(module.__name__ + '.decoder')
+        scanner = sys.modules.get(module.__name__ + '.scanner')
+        encoder = sys.modules.get(module.__name__ + '.encoder')
+        def implemented_in(module, name, c_name):
+            c_function = getattr(module, c_name, None)
+            if c_function is not None and getattr(module, name, None) is c_function:
+                return 'c'
+            return 'python'
+        info.update({
+            'module':     module.__name__,
+            'version':    getattr(module, '__version__', None),
+            'path':       os.path.dirname(os.path.abspath(module.__file__)),
+            'scanner':    implemented_in(scanner, 'make_scanner', 'c_make_scanner'),
+            'scanstring': implemented_in(decoder, 'scanstring',   'c_scanstring'),
+            # encoder in C is used unless indented or sorted
+            'encoder':    getattr(encoder, 'c_make_encoder', None) and 'c' or 'python',
+            'encode_basestring_ascii': implemented_in(encoder, 
+                            'encode_basestring_ascii', 'c_encode_basestring_ascii'),
+        })
+        if self.pure_python:
+            for part in parts: info[part] = 'python'
+        return info
+
+# registered codecs, in the order of preference. the first is used by default
+json_codecs = []
+
+def register_json_codec(name, loads, dumps, module=None, pure_python=False):
+    ''' register a json library as codec `name', replacing the one with the
+    same name. it is used once chosen by use_json_codec(name), or by 
+    use_json_codec() if it is the fastest
+
+    loads may ignore object_hook; resources are built from what it returns.
+    dumps is given ensure_ascii=False when resources are encoded
+
+    >> register_json_codec('cjson', lambda data, object_hook=None: cjson.decode(data),
+    ..                              lambda obj, ensure_ascii=True: cjson.encode(obj))
+    '''
+    codec = JsonCodec(name, loads, dumps, module, pure_python)
+    for i, registered in enumerate(json_codecs):
+        if registered.name == name:
+            json_codecs[i] = codec
+            break
+    else:
+        json_codecs.append(codec)
+    return codec
+
+def json_codec(name):
+    ''' registered codec of the name, or None '''
+    for codec in json_codecs:
+        if codec.name == name:
+            return codec
+    return None
+
+def simplejson_python_codec(simplejson):
+    ''' codec on simplejson, scanning and encoding in python even if its 
+    speedups are built '''
+    from simplejson.decoder import py_scanstring
+    from simplejson.scanner import py_make_scanner
+    def loads(data, object_hook=None, **kwarg):
+        decoder = simplejson.JSONDecoder(object_hook=object_hook, **kwarg)
+        decoder.parse_string = py_scanstring
+        decoder.scan_once    = py_make_scanner(decoder)
+        return decoder.decode(data)
+    def dumps(obj, **kwarg):
+        chunks = simplejson.JSONEncoder(**kwarg).iterencode(obj)
+        return ''.join(chunks)
+    return loads, dumps
+
+# codecs in C go first, so that json of python is preferred to bundled 
+# simplejson whose speedups are not built
+simplejson_in_c = simplejson is not None and \
+        JsonCodec('', None, None, simplejson).info()['scanner'] == 'c'
+if simplejson_in_c:
+    register_json_codec('simplejson', simplejson.loads, simplejson.dumps, simplejson)
+if stdlib_json:
+    register_json_codec('json', stdlib_json.loads, stdlib_json.dumps, stdlib_json)
+if simplejson_in_c:
+    loads, dumps = simplejson_python_codec(simplejson)
+    register_json_codec('simplejson-python', loads, dumps, simplejson, pure_python=True)
+elif simplejson:
+    register_json_codec('simplejson', simplejson.loads, simplejson.dumps, simplejson)
+if not json_codecs:
+    sys.exit("cannot find json library. try installing simplejson")
+
+# sample measured to choose the fastest codec: a page list with korean source
+JSON_SAMPLE = [{'page': {
+    'identifier': id, 'title': u'페이지 %d' % id, 'tags': 'sample,page',
+    'source': u'<p>스프링노트는 웹에서 쓰는 노트입니다.</p>\n' * 4,
+    'creator': 'http://deepblue.myid.net/', 'rights': None,
+    'date_created': '2007/10/26 05:30:08 +0000',
+    'relation_is_part_of': id // 5 or None,
+}} for id in range(1, 21)]
+
+def measure_json_codec(codec, sample=JSON_SAMPLE, times=5):
+    ''' seconds codec takes to encode and decode the sample, best of a few 
+    times. None if the codec fails on it '''
+    best = None
+    try:
+        for i in range(times):
+            started = time.time()
+            codec.loads(codec.dumps(sample, ensure_ascii=False))
+            elapsed = time.time() - started
+            if best is None or elapsed < best:
+                best = elapsed
+    except Exception:
+        return None
+    return best
+
+def fastest_json_codec(margin=0.2):
+    ''' the codec encoding and decoding the sample fastest. one registered 
+    later is chosen only if it is faster by margin, so that the choice does
+    not change by chance from run to run '''
+    fastest, best = json_codecs[0], None
+    for codec in json_codecs:
+        elapsed = measure_json_codec(codec)
+        if elapsed is not None and (best is None or elapsed < best * (1 - margin)):
+            fastest, best = codec, elapsed
+    return fastest
+
+def use_json_codec(name=None):
+    ''' decode and encode resources with the codec registered as `name', 
+    the first one registered if name is None, or the fastest one measured 
+    if name is 'auto'. returns the codec, which is springnote.json from 
+    then on
+
+    the codec is chosen when springnote is imported, by the environment 
+    variable SPRINGNOTE_JSON if it is set: a name, or 'auto' '''
+    global json
+    if name is None:
+        codec = json_codecs[0]
+    elif name == 'auto':
+        codec = fastest_json_codec()
+    else:
+        codec = json_codec(name)
+        if codec is None:
+            raise SpringnoteError.InvalidOption("no json codec named %s. choose one of %s" % \
+                    (name, ', '.join(registered.name for registered in json_codecs)))
+    json = codec
+    return json
+
+json = None # JsonCodec in use, chosen once SpringnoteError is defined
+
+
+def json_backend_info():
+    ''' which json codec is used, whether scanner, string scanner, encoder
+    and string encoder of its library are the ones in C or in python, and 
+    whether C speedups of bundled simplejson are built
+
+    >> json_backend_info()
+    {'codec': 'simplejson', 'module': 'simplejson', 'version': '2.0.9', 
+     'path': '.../lib/simplejson', 'scanner': 'c', 'scanstring': 'c', 
+     'encoder': 'c', 'encode_basestring_ascii': 'c', 'bundled_speedups': True}
+    '''
+    info = json.info()
+    info['bundled_speedups'] = has_json_speedups()
+    return info
 
 
 # default consumer token (as springnote python library)
@@ -50,6 +294,9 @@ class SpringnoteError:
     class NoNetwork(Base):      pass # if requested without network connection
     class InvalidOption(Base):  pass # if user gave invalid argument
     class ParseError(Base):     pass # if received json is invalid
+    class Timeout(Base):        pass # if request did not finish in time
+    class SizeMismatch(Base):   pass # if received size differs from expected
+    class CircuitOpen(Base):    pass # if springnote.com is failing and not asked
     class Response(Base): # springnote.com error response
         # status codes and names, extracted from httplib
         http_status_map = {100: 'CONTINUE', 101: 'SWITCHING_PROTOCOLS', 102: 'PROCESSING', 200: 'OK', 201: 'CREATED', 202: 'ACCEPTED', 203: 'NON_AUTHORITATIVE_INFORMATION', 204: 'NO_CONTENT', 205: 'RESET_CONTENT', 206: 'PARTIAL_CONTENT', 207: 'MULTI_STATUS', 226: 'IM_USED', 300: 'MULTIPLE_CHOICES', 301: 'MOVED_PERMANENTLY', 302: 'FOUND', 303: 'SEE_OTHER', 304: 'NOT_MODIFIED', 305: 'USE_PROXY', 307: 'TEMPORARY_REDIRECT', 400: 'BAD_REQUEST', 401: 'UNAUTHORIZED', 402: 'PAYMENT_REQUIRED', 403: 'FORBIDDEN', 404: 'NOT_FOUND', 405: 'METHOD_NOT_ALLOWED', 406: 'NOT_ACCEPTABLE', 407: 'PROXY_AUTHENTICATION_REQUIRED', 408: 'REQUEST_TIMEOUT', 409: 'CONFLICT', 410: 'GONE', 411: 'LENGTH_REQUIRED', 412: 'PRECONDITION_FAILED', 413: 'REQUEST_ENTITY_TOO_LARGE', 414: 'REQUEST_URI_TOO_LONG', 415: 'UNSUPPORTED_MEDIA_TYPE', 416: 'REQUESTED_RANGE_NOT_SATISFIABLE', 417: 'EXPECTATION_FAILED', 422: 'UNPROCESSABLE_ENTITY', 423: 'LOCKED', 424: 'FAILED_DEPENDENCY', 426: 'UPGRADE_REQUIRED', 443: 'HTTPS_PORT', 500: 'INTERNAL_SERVER_ERROR', 501: 'NOT_IMPLEMENTED', 502: 'BAD_GATEWAY', 503: 'SERVICE_UNAVAILABLE', 504: 'GATEWAY_TIMEOUT', 505: 'HTTP_VERSION_NOT_SUPPORTED', 507: 'INSUFFICIENT_STORAGE', 510: 'NOT_EXTENDED'}
@@ -75,15 +322,1031 @@ class SpringnoteError:
             elif isinstance(e, types.DictType): return " - %s: %s" % (e["error"]["error_type"], e["error"]["description"])
             else:                               return ": %s" % e
 
-def is_verbose(verbose):
-    if verbose is True or (verbose is None and default_verbose is True):
-        return True
-    return False
+# json codec named in SPRINGNOTE_JSON, or the first registered
+use_json_codec(os.environ.get('SPRINGNOTE_JSON') or None)
+
+
+class Deadline(object):
+    ''' time by which every request made in a thread must finish, however 
+    deeply nested in composite operations such as Page.get_root or 
+    Revision.get(index=). requests are given only the time remaining, and 
+    fail with SpringnoteError.Timeout once it is gone.
+
+    >> Deadline(3).call(Page.get_root, sn)
+    >> with Deadline(3): page.get_parent()
+
+    a deadline inside another cannot go beyond the outer one. requests 
+    submitted to a RequestExecutor carry the deadline of the submitter '''
+    local = threading.local()
+
+    def __init__(self, seconds):
+        self.expires = time.time() + seconds
+
+    @staticmethod
+    def current():
+        ''' deadline of the running thread, or None '''
+        return getattr(Deadline.local, 'deadline', None)
+
+    def remaining(self):
+        return self.expires - time.time()
+
+    def call(self, function, *args, **kwarg):
+        ''' run function(*args, **kwarg) within the deadline '''
+        previous = Deadline.current()
+        if previous is not None:
+            self.expires = min(self.expires, previous.expires)
+        Deadline.local.deadline = self
+        try:
+            return function(*args, **kwarg)
+        finally:
+            Deadline.local.deadline = previous
+
+    def __enter__(self):
+        self.previous = Deadline.current()
+        if self.previous is not None:
+            self.expires = min(self.expires, self.previous.expires)
+        Deadline.local.deadline = self
+        return self
+    def __exit__(self, *exc_info):
+        Deadline.local.deadline = self.previous
+
+
+def is_verbose(verbose, default=None):
+    ''' verbose given to each call overrides the client default, which in turn
+    overrides the module-wide default_verbose '''
+    if verbose is None: verbose = default
+    if verbose is None: verbose = default_verbose
+    return verbose is True
+def is_dry_run(dry_run=None):
+    ''' dry_run of client overrides the module-wide default_dry_run '''
+    if dry_run is None: dry_run = default_dry_run
+    return dry_run is True
 def is_file_type(data):
     ''' needs data.name and data.read() to act as a file '''
     if hasattr(data, 'name') and hasattr(data, 'read') and callable(data.read):
          return True
     return False
+def file_size(file):
+    ''' size of the rest of file, without reading it. None if not known '''
+    try:
+        return os.fstat(file.fileno()).st_size - file.tell()
+    except:
+        return None
+
+
+class DecodedResponse(object):
+    ''' http response with gzip or deflate encoded body, decompressed as it 
+    is read. everything else is taken from the original response '''
+    block_size = 64 * 1024
+
+    def __init__(self, response, encoding):
+        self.response = response
+        self.wbits    = zlib.MAX_WBITS
+        if encoding in ('gzip', 'x-gzip'):
+            self.wbits += 16    # gzip header and trailer
+        self.decompressor = zlib.decompressobj(self.wbits)
+        self.started  = False
+        self.finished = False
+        # decompressed, not read yet. kept as chunks, from offset of the 
+        # first, so that each read copies only what it returns
+        self.chunks   = []
+        self.offset   = 0
+        self.buffered = 0
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+    def read(self, size=-1):
+        while not self.finished and (size < 0 or self.buffered < size):
+            chunk = self.response.read(self.block_size)
+            if chunk:
+                data = self.decompress(chunk)
+            else:
+                data = self.decompressor.flush()
+                self.finished = True
+            if data:
+                self.chunks.append(data)
+                self.buffered += len(data)
+        if size < 0 or size > self.buffered: 
+            size = self.buffered
+        parts, left = [], size
+        while left:
+            chunk = self.chunks[0]
+            part  = chunk[self.offset:self.offset + left]
+            parts.append(part)
+            left        -= len(part)
+            self.offset += len(part)
+            if self.offset == len(chunk):
+                self.chunks.pop(0)
+                self.offset = 0
+        self.buffered -= size
+        return ''.join(parts)
+
+    def decompress(self, chunk):
+        try:
+            data = self.decompressor.decompress(chunk)
+        except zlib.error:
+            # some servers send deflate without zlib header
+            if self.started or self.wbits != zlib.MAX_WBITS: raise
+            self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            data = self.decompressor.decompress(chunk)
+        self.started = True
+        return data
+
+def decoded(response):
+    ''' response decompressed as it is read, if its body is encoded '''
+    encoding = (response.getheader('content-encoding') or '').strip().lower()
+    if encoding in ('gzip', 'x-gzip', 'deflate'):
+        return DecodedResponse(response, encoding)
+    return response
+
+
+def socket_of(response):
+    ''' socket the body of an httplib response is read from, or None once
+    it is read '''
+    return getattr(getattr(response, 'fp', None), '_sock', None)
+
+def read_in_time(response, size=-1, read_timeout=None):
+    ''' response.read(size), each wait for the socket no longer than 
+    read_timeout nor what is left of the Deadline. raises 
+    SpringnoteError.Timeout if it does not come in time '''
+    deadline = Deadline.current()
+    try:
+        if deadline is not None:
+            remaining = deadline.remaining()
+            if remaining <= 0:
+                raise SpringnoteError.Timeout("deadline has passed while reading response")
+            sock = socket_of(response)
+            if sock is not None:
+                sock.settimeout(min(read_timeout or remaining, remaining))
+        if size < 0: return response.read()
+        else:        return response.read(size)
+    except socket.timeout:
+        raise SpringnoteError.Timeout("response is not read in time")
+
+def read_body(response, read_timeout=None, chunk_size=16*1024):
+    ''' the whole body of response. read a chunk at a time within the 
+    Deadline if there is one, as a body coming slowly would outlast it with
+    the timeout of each read '''
+    if Deadline.current() is None:
+        return read_in_time(response, read_timeout=read_timeout)
+    chunks = []
+    while True:
+        chunk = read_in_time(response, chunk_size, read_timeout)
+        if not chunk: break
+        chunks.append(chunk)
+    return ''.join(chunks)
+
+
+class MultipartBody(object):
+    ''' multipart/form-data body wrapping a file, read piece by piece so 
+    that the file is streamed from disk instead of loaded into memory.
+
+    len() gives the size of the whole body, known from os.fstat(), for the 
+    Content-Length header. file objects that are not on disk are read at 
+    once, as they cannot tell their size otherwise '''
+    def __init__(self, file, boundary='AaB03x'):
+        self.name     = file.name
+        self.preamble = "\r\n".join([
+            '--%s' % boundary,
+            'Content-Disposition: form-data; name="Filedata"; filename="%s"' % file.name,
+            'Content-Transfer-Encoding: binary',
+            'Content-Type: application/octet-stream',
+            '', '',
+        ])
+        self.epilogue = "\r\n--%s--" % boundary
+
+        size = file_size(file)
+        if size is None:
+            content = file.read()
+            size, file = len(content), StringIO.StringIO(content)
+        self.file  = file
+        self.start = file.tell()
+        self.size  = len(self.preamble) + size + len(self.epilogue)
+        self.seek(0)
+
+    def __len__(self):
+        return self.size
+    def __repr__(self):
+        return "<multipart body of %r, %d bytes>" % (self.name, self.size)
+
+    def read(self, size=-1):
+        ''' read preamble, file and epilogue in turn, at most size bytes '''
+        chunks = []
+        while self.parts and size != 0:
+            chunk = self.parts[0].read(size)
+            if not chunk:
+                self.parts.pop(0)
+                continue
+            chunks.append(chunk)
+            if size > 0: size -= len(chunk)
+        return ''.join(chunks)
+
+    def seek(self, offset):
+        ''' only rewinding to the beginning is supported '''
+        if offset != 0:
+            raise SpringnoteError.InvalidOption("cannot seek multipart body to %d" % offset)
+        self.file.seek(self.start)
+        self.parts = [StringIO.StringIO(self.preamble), self.file, 
+                        StringIO.StringIO(self.epilogue)]
+
+
+class ConnectionPool(object):
+    ''' keeps persistent HTTP/1.1 connections, keyed by (host, secure), so that
+    consecutive requests to springnote.com skip the TCP(and TLS) handshake.
+
+     * max_size: maximum number of connections kept for each (host, secure)
+     * max_idle: seconds an unused connection is kept before being closed
+
+    a connection is handed back right after its response is received, but is
+    reused only after the response has been read to the end.
+    '''
+    def __init__(self, max_size=4, max_idle=60):
+        self.max_size    = max_size
+        self.max_idle    = max_idle
+        self.lock        = threading.Lock()
+        self.connections = {}   # (host, secure) => [[conn, response, last_used], ..]
+
+    def connect(self, host, secure=False):
+        ''' create a new http(s) connection '''
+        if secure:  return httplib.HTTPSConnection(host)
+        else:       return httplib.HTTPConnection(host)
+
+    @staticmethod
+    def set_timeouts(conn, connect_timeout=None, read_timeout=None):
+        ''' connect conn within connect_timeout if not connected yet, and let 
+        it wait at most read_timeout for each read. None is no limit, so
+        that a reused connection does not keep the timeouts of its last user '''
+        if connect_timeout is None:
+            connect_timeout = getattr(socket, '_GLOBAL_DEFAULT_TIMEOUT', None)
+        conn.timeout = connect_timeout
+        if conn.sock is None:
+            if read_timeout is None:
+                return # connected as it sends the request
+            conn.connect()
+        conn.sock.settimeout(read_timeout)
+
+    def acquire(self, host, secure=False):
+        ''' returns a pair of (connection, reused). reuses a free connection
+        if there is any, or creates a new one '''
+        self.lock.acquire()
+        try:
+            self.evict()
+            entries = self.connections.get((host, secure), [])
+            for entry in entries:
+                conn, response, last_used = entry
+                if self._is_free(response):
+                    entries.remove(entry)
+                    return conn, True
+        finally:
+            self.lock.release()
+        return self.connect(host, secure), False
+
+    def release(self, host, secure, conn, response=None):
+        ''' put back the connection along with its pending response.
+        the connection is dropped if the pool is full '''
+        self.lock.acquire()
+        try:
+            entries = self.connections.setdefault((host, secure), [])
+            if len(entries) < self.max_size:
+                entries.append([conn, response, time.time()])
+        finally:
+            self.lock.release()
+
+    def evict(self, now=None):
+        ''' close connections that have been idle longer than max_idle. those
+        whose response is still being read as long are dropped from the pool
+        without being closed, so that they do not hold their place forever
+        while the body is read to the end. must be called holding the lock '''
+        now = now or time.time()
+        for entries in self.connections.itervalues():
+            for entry in entries[:]:
+                conn, response, last_used = entry
+                if now - last_used > self.max_idle:
+                    entries.remove(entry)
+                    if self._is_free(response):
+                        conn.close()
+
+    def discard(self, response):
+        ''' close and drop the connection response is read from, which 
+        cannot be reused once its body is left unread '''
+        if isinstance(response, DecodedResponse):
+            response = response.response
+        self.lock.acquire()
+        try:
+            for entries in self.connections.itervalues():
+                for entry in entries[:]:
+                    conn, pending, last_used = entry
+                    if pending is response:
+                        entries.remove(entry)
+                        conn.close()
+        finally:
+            self.lock.release()
+
+    def clear(self):
+        ''' close every connection in the pool '''
+        self.lock.acquire()
+        try:
+            for entries in self.connections.itervalues():
+                for conn, response, last_used in entries:
+                    conn.close()
+            self.connections = {}
+        finally:
+            self.lock.release()
+
+    @staticmethod
+    def _is_free(response):
+        ''' connection can send another request once response is read '''
+        return response is None or response.isclosed()
+
+
+class ValidatorCache(object):
+    ''' keeps resources fetched by GET along with their validators, ETag and 
+    Last-Modified, so that they are requested again conditionally and 
+    served from the cache when springnote.com answers 304 Not Modified.
+
+     * max_entries: number of resources kept. least recently used goes first
+
+    resources are copied in and out, so that changes made to the resource 
+    returned do not leak into the cache '''
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.lock    = threading.Lock()
+        self.entries = {}   # key => (etag, last_modified, resource)
+        self.order   = []   # keys, least recently used first
+
+    def get(self, key):
+        ''' returns (etag, last_modified, resource) or None '''
+        self.lock.acquire()
+        try:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.order.remove(key)
+                self.order.append(key)
+            return entry
+        finally:
+            self.lock.release()
+
+    def put(self, key, etag, last_modified, resource):
+        self.lock.acquire()
+        try:
+            if key in self.entries:
+                self.order.remove(key)
+            self.entries[key] = (etag, last_modified, copy_resource(resource))
+            self.order.append(key)
+            while len(self.order) > self.max_entries:
+                del self.entries[self.order.pop(0)]
+        finally:
+            self.lock.release()
+
+    def discard(self, key):
+        self.lock.acquire()
+        try:
+            if self.entries.pop(key, None) is not None:
+                self.order.remove(key)
+        finally:
+            self.lock.release()
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.entries, self.order = {}, []
+        finally:
+            self.lock.release()
+
+
+class RetryBudget(object):
+    ''' limits retries to a share of requests, so that a degraded server is
+    not flooded with retries. every request deposits `ratio' of a retry, 
+    and `min_per_second' retries are allowed regardless, starting with a 
+    second's worth. at most `max_retries' can be saved up '''
+    def __init__(self, ratio=0.2, min_per_second=1.0, max_retries=100):
+        self.ratio          = ratio
+        self.min_per_second = min_per_second
+        self.max_retries    = max_retries
+        self.lock        = threading.Lock()
+        self.balance     = float(min_per_second)
+        self.last_refill = time.time()
+
+    def deposit(self):
+        self.lock.acquire()
+        try:
+            self.balance = min(self.max_retries, self.balance + self.ratio)
+        finally:
+            self.lock.release()
+
+    def withdraw(self):
+        ''' True if there is a retry to spend '''
+        self.lock.acquire()
+        try:
+            now = time.time()
+            self.balance = min(self.max_retries, 
+                self.balance + (now - self.last_refill) * self.min_per_second)
+            self.last_refill = now
+            if self.balance < 1:
+                return False
+            self.balance -= 1
+            return True
+        finally:
+            self.lock.release()
+
+
+class RetryPolicy(object):
+    ''' decides whether and when a failed request is sent again.
+
+     * max_retries: retries for each request
+     * backoff    : seconds to wait before the first retry, doubled every retry
+     * max_backoff: longest wait between retries
+     * methods    : http methods safe to send again. add 'PUT' if you like
+     * statuses   : response status to retry on. network errors are retried too
+     * budget     : RetryBudget shared by the requests, a new one unless 
+                    given. None for no limit
+
+    wait is chosen at random up to the backoff (full jitter), unless the
+    server gives Retry-After, which is waited no longer than max_backoff.
+    counts are in stats, for metrics '''
+    new_budget = object() # default of budget, as None turns the budget off
+
+    def __init__(self, max_retries=3, backoff=0.5, max_backoff=30, 
+            methods=('GET',), statuses=(500, 502, 503, 504), budget=new_budget):
+        self.max_retries = max_retries
+        self.backoff     = backoff
+        self.max_backoff = max_backoff
+        self.methods     = methods
+        self.statuses    = statuses
+        if budget is RetryPolicy.new_budget:
+            budget = RetryBudget()
+        self.budget      = budget
+        self.lock  = threading.Lock()
+        self.stats = {'requests': 0, 'retries': 0, 'gave_up': 0, 'over_budget': 0}
+
+    def count(self, name):
+        self.lock.acquire()
+        try:
+            self.stats[name] += 1
+        finally:
+            self.lock.release()
+
+    def started(self):
+        ''' a new request is made '''
+        self.count('requests')
+        if self.budget is not None: self.budget.deposit()
+
+    def should_retry(self, method, body, attempt):
+        ''' True if request can be sent again after attempt-th failure '''
+        if method.upper() not in self.methods: 
+            return False
+        if is_file_type(body) and not hasattr(body, 'seek'): 
+            return False    # body cannot be read again
+        if attempt >= self.max_retries:
+            self.count('gave_up')
+            return False
+        if self.budget is not None and not self.budget.withdraw():
+            self.count('over_budget')
+            return False
+        self.count('retries')
+        return True
+
+    def delay(self, attempt, retry_after=None):
+        ''' seconds to wait before the attempt-th retry '''
+        if retry_after:
+            if retry_after.strip().isdigit():
+                return min(self.max_backoff, int(retry_after))
+            date = rfc822.parsedate_tz(retry_after)
+            if date:
+                return min(self.max_backoff, max(0, rfc822.mktime_tz(date) - time.time()))
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class TokenBucket(object):
+    ''' allows `rate' requests per second on average, and up to `burst' 
+    at once. shared among threads '''
+    def __init__(self, rate, burst=None):
+        self.rate    = float(rate)
+        self.burst   = float(burst or max(1, rate))
+        self.lock    = threading.Lock()
+        self.tokens  = self.burst
+        self.updated = time.time()
+
+    def acquire(self, tokens=1):
+        ''' wait until tokens are available and take them '''
+        while True:
+            self.lock.acquire()
+            try:
+                wait = self._take(tokens)
+            finally:
+                self.lock.release()
+            if wait <= 0: 
+                return
+            time.sleep(wait)
+
+    def _take(self, tokens):
+        ''' take tokens if available and return 0, or seconds to wait '''
+        now = time.time()
+        self.tokens  = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0
+        return (tokens - self.tokens) / self.rate
+
+
+class FileTokenBucket(TokenBucket):
+    ''' TokenBucket kept in a file, locked while it is used, so that every 
+    process on the host using the same path shares one budget '''
+    def __init__(self, path, rate, burst=None):
+        if fcntl is None:
+            raise SpringnoteError.InvalidOption("file lock is not available on this platform")
+        TokenBucket.__init__(self, rate, burst)
+        self.path = path
+
+    def acquire(self, tokens=1):
+        while True:
+            self.lock.acquire()
+            try:
+                wait = self._take_from_file(tokens)
+            finally:
+                self.lock.release()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def _take_from_file(self, tokens):
+        file = open(self.path, 'a+')
+        try:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+            file.seek(0)
+            try:
+                self.tokens, self.updated = map(float, file.read().split())
+            except ValueError: # new file
+                self.tokens, self.updated = self.burst, time.time()
+            wait = self._take(tokens)
+            file.seek(0)
+            file.truncate()
+            file.write("%r %r" % (self.tokens, self.updated))
+            file.flush()
+            return wait
+        finally:
+            file.close() # releases the lock
+
+
+class RateLimiter(object):
+    ''' limits requests sent by clients sharing it. every request takes 
+    from the bucket of the client, and one of its note if note_rate is given.
+
+     * rate, burst          : requests per second, and at once, in total
+     * note_rate, note_burst: requests per second, and at once, for each note
+     * path                 : keep buckets in files starting with path, to 
+                              share them among processes on the host 
+    '''
+    def __init__(self, rate, burst=None, note_rate=None, note_burst=None, path=None):
+        self.note_rate  = note_rate
+        self.note_burst = note_burst
+        self.path       = path
+        self.lock       = threading.Lock()
+        self.bucket     = self.new_bucket(rate, burst)
+        self.note_buckets = {}  # note => bucket
+
+    def new_bucket(self, rate, burst, name=None):
+        if self.path is None:
+            return TokenBucket(rate, burst)
+        path = self.path
+        if name: path += '.' + urllib.quote(name, safe='')
+        return FileTokenBucket(path, rate, burst)
+
+    def acquire(self, note=None):
+        ''' wait until a request is allowed for the note '''
+        if note and self.note_rate:
+            self.note_bucket(note).acquire()
+        self.bucket.acquire()
+
+    def note_bucket(self, note):
+        self.lock.acquire()
+        try:
+            if note not in self.note_buckets:
+                self.note_buckets[note] = \
+                    self.new_bucket(self.note_rate, self.note_burst, name=note)
+            return self.note_buckets[note]
+        finally:
+            self.lock.release()
+
+
+class ConcurrencyController(object):
+    ''' adapts the number of requests in flight to what the server can take,
+    by additive increase and multiplicative decrease (AIMD). 
+
+    limit grows by `increase' every `limit' successful responses while 
+    latency stays flat, and is multiplied by `decrease' on server errors, 
+    network errors and responses slower than `latency_factor' times the 
+    usual. it stays between min_limit and max_limit '''
+    def __init__(self, initial=4, min_limit=1, max_limit=32, increase=1.0, 
+            decrease=0.5, latency_factor=2.0):
+        self.limit     = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase  = increase
+        self.decrease  = decrease
+        self.latency_factor = latency_factor
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.latency   = None   # moving average of good latencies
+        self.last_decrease = 0
+
+    def acquire(self):
+        ''' wait until a request can be sent '''
+        self.condition.acquire()
+        try:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+        finally:
+            self.condition.release()
+
+    def release(self, latency, ok=True):
+        ''' a request is finished, taking latency seconds '''
+        self.condition.acquire()
+        try:
+            self.in_flight -= 1
+            self.observe(latency, ok)
+            self.condition.notifyAll()
+        finally:
+            self.condition.release()
+
+    def observe(self, latency, ok=True):
+        ''' adjust limit by the result of a request. called holding the lock '''
+        slow = self.latency is not None and latency > self.latency * self.latency_factor
+        if ok and not slow:
+            if self.latency is None: self.latency = latency
+            else:                    self.latency = 0.9 * self.latency + 0.1 * latency
+            self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+            return
+        # decrease once for the requests sent around the same time
+        now = time.time()
+        if now - self.last_decrease < (self.latency or latency):
+            return
+        self.last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.decrease)
+
+
+class CircuitBreaker(object):
+    ''' stops sending requests for a while when springnote.com is failing, 
+    so that callers fail fast instead of piling up on a degraded server.
+
+    it is 'closed' while requests go well, and gets 'open' when at least
+    `failure_ratio' of the last `window' requests have failed, once there
+    are `min_requests' of them. a request fails by network error, server 
+    error(5xx) or taking longer than `slow_latency' seconds if given. 
+    requests are refused while open, and after `reset_timeout' seconds it 
+    is 'half_open' to let a trial request through: success closes it, and 
+    failure opens it again '''
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_ratio=0.5, min_requests=10, window=20, 
+            slow_latency=None, reset_timeout=30):
+        self.failure_ratio = failure_ratio
+        self.min_requests  = min_requests
+        self.window        = window
+        self.slow_latency  = slow_latency
+        self.reset_timeout = reset_timeout
+        self.lock     = threading.Lock()
+        self.state    = self.CLOSED
+        self.results  = []   # True for each of recent requests which failed
+        self.opened   = 0    # when it got open
+        self.trial    = None # when the trial request is sent, if half open
+        self.stats    = dict(opened=0, rejected=0, failures=0)
+
+    def allow(self):
+        ''' raises SpringnoteError.CircuitOpen unless a request can be sent '''
+        self.lock.acquire()
+        try:
+            now = time.time()
+            if self.state == self.OPEN and now - self.opened >= self.reset_timeout:
+                self.state, self.trial = self.HALF_OPEN, None
+            if self.state == self.HALF_OPEN:
+                # one trial at a time, unless it is lost on the way
+                if self.trial is None or now - self.trial >= self.reset_timeout:
+                    self.trial = now
+                    return
+            if self.state == self.CLOSED:
+                return
+            self.stats['rejected'] += 1
+        finally:
+            self.lock.release()
+        raise SpringnoteError.CircuitOpen("springnote.com is failing. not asked until %s seconds later" % self.reset_timeout)
+
+    def record(self, ok, latency=None):
+        ''' result of a request sent '''
+        failed = not ok or (self.slow_latency is not None and 
+                            latency is not None and latency > self.slow_latency)
+        self.lock.acquire()
+        try:
+            if failed: self.stats['failures'] += 1
+            if self.state == self.HALF_OPEN:
+                if failed: self._open()
+                else:      self.state, self.results = self.CLOSED, []
+                return
+            self.results.append(failed)
+            del self.results[:-self.window]
+            if self.state == self.CLOSED and len(self.results) >= self.min_requests \
+                    and self.results.count(True) >= self.failure_ratio * len(self.results):
+                self._open()
+        finally:
+            self.lock.release()
+
+    def _open(self):
+        ''' called holding the lock '''
+        self.state, self.opened, self.results = self.OPEN, time.time(), []
+        self.stats['opened'] += 1
+
+
+class HedgePolicy(object):
+    ''' cuts tail latency of reads by sending a second request when the 
+    first has not answered within the `percentile' of recent latencies, 
+    and taking whichever response comes first. the other is thrown away.
+
+     * min_samples: latencies to observe before hedging at all
+     * window:      number of recent latencies kept
+     * min_delay:   seconds to wait at least before hedging
+     * max_hedges:  second requests in flight at most. a late request is 
+                    not hedged while this many are
+
+    each request is sent in a thread of its own, so that no request waits
+    for a free thread behind the others '''
+    def __init__(self, percentile=95, min_samples=20, window=200, 
+            min_delay=0.01, max_hedges=8):
+        self.percentile  = percentile
+        self.min_samples = min_samples
+        self.window      = window
+        self.min_delay   = min_delay
+        self.hedges      = threading.Semaphore(max_hedges)
+        self.lock    = threading.Lock()
+        self.samples = []   # recent latencies, oldest replaced first
+        self.next    = 0    # index of the next sample to replace
+        self.stats   = dict(requests=0, hedged=0, hedge_won=0, not_hedged=0)
+
+    def observe(self, latency):
+        self.lock.acquire()
+        try:
+            if len(self.samples) < self.window:
+                self.samples.append(latency)
+            else:
+                self.samples[self.next] = latency
+            self.next = (self.next + 1) % self.window
+        finally:
+            self.lock.release()
+
+    def delay(self):
+        ''' seconds to wait for the first response before hedging, or None
+        if too few latencies are observed yet '''
+        self.lock.acquire()
+        try:
+            if len(self.samples) < max(1, self.min_samples):
+                return None
+            samples = sorted(self.samples)
+        finally:
+            self.lock.release()
+        index = min(len(samples) - 1, int(len(samples) * self.percentile / 100.0))
+        return max(self.min_delay, samples[index])
+
+    def run(self, function, args=(), kwarg={}, discard=None):
+        ''' returns function(*args, **kwarg), called again if it is late. 
+        exception is raised only if every call fails. discard(result) is 
+        called with the result which has lost '''
+        def timed():
+            started = time.time()
+            result  = function(*args, **kwarg)
+            self.observe(time.time() - started)
+            return result
+
+        delay = self.delay()
+        self.count('requests')
+        if delay is None:
+            return timed()
+
+        finished = Queue.Queue()
+        futures  = [self.spawn(timed)]
+        futures[0].add_done_callback(finished.put)
+        try:
+            future = finished.get(True, delay)
+        except Queue.Empty:
+            if not self.hedges.acquire(False):
+                self.count('not_hedged')
+                future = finished.get()
+            else:
+                self.count('hedged')
+                futures.append(self.spawn(timed))
+                futures[1].add_done_callback(lambda future: self.hedges.release())
+                futures[1].add_done_callback(finished.put)
+                future = finished.get()
+                # first one to succeed wins
+                if future.exception() is not None:
+                    future = finished.get()
+
+        def throw_away(other):
+            if other.exception() is None and discard is not None:
+                discard(other.result())
+        for other in futures:
+            if other is not future:
+                other.add_done_callback(throw_away)
+        if future is not futures[0]:
+            self.count('hedge_won')
+        return future.result()
+
+    def count(self, name):
+        self.lock.acquire()
+        try:
+            self.stats[name] += 1
+        finally:
+            self.lock.release()
+
+    @staticmethod
+    def spawn(function):
+        ''' run function() in a new thread, within the Deadline of the 
+        caller, and return its Future '''
+        future, deadline = Future(), Deadline.current()
+        def work():
+            Deadline.local.deadline = deadline
+            try:
+                future.set_result(function())
+            except:
+                future.set_exception(sys.exc_info())
+        thread = threading.Thread(target=work)
+        thread.setDaemon(True)
+        thread.start()
+        return future
+
+
+class Future(object):
+    ''' result of a request running in the background. 
+
+    result() waits for the request to finish and returns its value, or 
+    raises the exception the request has raised '''
+    def __init__(self):
+        self.event     = threading.Event()
+        self.lock      = threading.Lock()
+        self.value     = None
+        self.exc_info  = None   # (type, value, traceback) if request failed
+        self.callbacks = []
+
+    def done(self):
+        return self.event.isSet()
+
+    def result(self, timeout=None):
+        ''' wait for the request and return its value '''
+        self.wait(timeout)
+        if self.exc_info:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+        return self.value
+
+    def exception(self, timeout=None):
+        ''' wait for the request and return the exception raised, if any '''
+        self.wait(timeout)
+        if self.exc_info:
+            return self.exc_info[1]
+
+    def wait(self, timeout=None):
+        self.event.wait(timeout)
+        if not self.done():
+            raise SpringnoteError.Timeout("request did not finish in %s seconds" % timeout)
+
+    def add_done_callback(self, callback):
+        ''' callback(future) is called when the request is finished '''
+        self.lock.acquire()
+        try:
+            if not self.done():
+                self.callbacks.append(callback)
+                return
+        finally:
+            self.lock.release()
+        callback(self)
+
+    def set_result(self, value):
+        self.value = value
+        self._finish()
+    def set_exception(self, exc_info):
+        self.exc_info = exc_info
+        self._finish()
+    def _finish(self):
+        self.lock.acquire()
+        try:
+            self.event.set()
+            callbacks, self.callbacks = self.callbacks, []
+        finally:
+            self.lock.release()
+        for callback in callbacks:
+            callback(self)
+
+
+class RequestExecutor(object):
+    ''' runs requests in a fixed number of worker threads. 
+
+    at most `workers' requests are in flight at a time, however many are 
+    submitted; the rest wait in the queue. threads are started on demand
+    and stopped by shutdown() '''
+    def __init__(self, workers=8):
+        self.workers = workers
+        self.queue   = Queue.Queue()
+        self.threads = []
+        self.lock    = threading.Lock()
+
+    def submit(self, function, *args, **kwarg):
+        ''' run function(*args, **kwarg) in a worker and return its Future '''
+        future = Future()
+        self.queue.put((future, Deadline.current(), function, args, kwarg))
+        self._start_worker()
+        return future
+
+    def in_worker(self):
+        ''' True if called in one of the workers '''
+        return threading.currentThread() in self.threads
+
+    def shutdown(self, wait=True):
+        ''' stop the workers after the queued requests are done '''
+        self.lock.acquire()
+        try:
+            threads, self.threads = self.threads, []
+        finally:
+            self.lock.release()
+        for thread in threads:
+            self.queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _start_worker(self):
+        self.lock.acquire()
+        try:
+            if len(self.threads) >= self.workers: 
+                return
+            thread = threading.Thread(target=self._work)
+            thread.setDaemon(True)
+            self.threads.append(thread) # before it starts to tell in_worker()
+            thread.start()
+        finally:
+            self.lock.release()
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is None: 
+                break
+            future, deadline, function, args, kwarg = item
+            Deadline.local.deadline = deadline
+            try:
+                future.set_result(function(*args, **kwarg))
+            except:
+                future.set_exception(sys.exc_info())
+            Deadline.local.deadline = None
+
+
+class SingleFlight(object):
+    ''' lets identical requests made at the same time share one request. 
+
+    the first caller of do() with a key runs the request, and the others 
+    calling with the same key meanwhile wait for its result, or exception, 
+    instead of sending their own, no longer than their own Deadline. key is
+    forgotten once the request is done, so that a later call sends a fresh
+    request '''
+    def __init__(self):
+        self.lock  = threading.Lock()
+        self.calls = {}     # key => Future of the request in flight
+        self.stats = dict(requests=0, shared=0)
+
+    def do(self, key, function, *args, **kwarg):
+        ''' returns function(*args, **kwarg), or the result of the call
+        with the same key already in flight '''
+        self.lock.acquire()
+        try:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = self.calls[key] = Future()
+                self.stats['requests'] += 1
+            else:
+                self.stats['shared'] += 1
+        finally:
+            self.lock.release()
+        if not leader:
+            deadline = Deadline.current()
+            if deadline is None:
+                return future.result()
+            return future.result(max(0, deadline.remaining()))
+
+        try:
+            try:
+                future.set_result(function(*args, **kwarg))
+            except:
+                future.set_exception(sys.exc_info())
+        finally:
+            self.lock.acquire()
+            try:
+                del self.calls[key]
+            finally:
+                self.lock.release()
+        return future.result()
 
 
 class Springnote(object):
@@ -94,17 +1357,49 @@ class Springnote(object):
     DEFAULT_CONTENT_TYPE   = 'application/json'
     MULTIPART_CONTENT_TYPE = 'multipart/form-data; boundary=%s' % BOUNDARY
 
-    def __init__(self, access_token=None, consumer_token=(DEFAULT_CONSUMER_TOKEN_KEY, DEFAULT_CONSUMER_TOKEN_SECRET), verbose=None):
+    def __init__(self, access_token=None, consumer_token=(DEFAULT_CONSUMER_TOKEN_KEY, DEFAULT_CONSUMER_TOKEN_SECRET), verbose=None, dry_run=None, pool=None, compress=True, cache=None, retry=None, rate_limiter=None, concurrency=None, connect_timeout=None, read_timeout=None, single_flight=None, hedge=None, circuit_breaker=None):
         """ intialize consumer token, and optioanlly an access token.
         
         If consumer token is not given, it uses basic consumer token (registered 
         for the library itself). However, you need to specify the access token, 
         either previously saved or acquired through user authorization later on,
-        to request the resources """
+        to request the resources 
+        
+        connections are kept alive in pool, which can be shared among clients.
+        verbose and dry_run apply to every request made through this client,
+        including the resources built with it. resources are requested with
+        gzip or deflate compression unless compress is False. 
+        
+        if a ValidatorCache is given as cache, resources are fetched 
+        conditionally and served from it while they are not modified. 
+        failed resource requests are sent again as RetryPolicy retry says. 
+        every request waits for its turn at rate_limiter, a RateLimiter 
+        which can be shared among clients. resource requests in flight are 
+        kept within the limit of ConcurrencyController concurrency. 
+        
+        connect_timeout and read_timeout are seconds to wait for connecting 
+        and for each read, shortened to what is left of the Deadline if any. 
+        identical resource GETs in flight at once share a request if 
+        single_flight, a SingleFlight which can be shared among clients, 
+        is given. reads asked to be hedged are sent again as HedgePolicy 
+        hedge says, when the first is late. requests are refused at once 
+        while CircuitBreaker circuit_breaker is open """
         self.consumer_token = self.format_token(consumer_token)
         self.set_access_token(access_token)
 
-        self.verbose = verbose
+        self.verbose  = verbose
+        self.dry_run  = dry_run
+        self.pool     = pool or ConnectionPool()
+        self.compress = compress
+        self.cache    = cache
+        self.retry    = retry
+        self.rate_limiter = rate_limiter
+        self.concurrency  = concurrency
+        self.connect_timeout = connect_timeout
+        self.read_timeout    = read_timeout
+        self.single_flight   = single_flight
+        self.hedge           = hedge
+        self.circuit_breaker = circuit_breaker
 
     def set_access_token(self, *args):
         """ sets the access token. 
@@ -138,14 +1433,14 @@ class Springnote(object):
             secure=True, sign_token=None, verbose=verbose)
 
         # parse request token
-        if default_dry_run:
+        if is_dry_run(self.dry_run):
             return oauth.OAuthToken('FAKE_REQUEST_TOKEN_KEY', 'FAKE_REQUEST_TOKEN_SECRET')
 
         if response.status != httplib.OK:
             raise SpringnoteError.Response(response, 'make sure to use POST and HTTPS without any sign token')
         request_token = oauth.OAuthToken.from_string(response.read())
 
-        if is_verbose(verbose):
+        if is_verbose(verbose, self.verbose):
             print "<< request token:", (request_token.key, request_token.secret)
 
         return request_token
@@ -201,14 +1496,14 @@ class Springnote(object):
                 return oauth.OAuthToken(args[0].key, args[0].secret)
         return
 
-    def oauth_request(self, method, url, params=None, sign_token=None, verbose=False):
+    def oauth_request(self, method, url, params=None, sign_token=None, verbose=None):
         ''' generates OAuth request, which is inserted in headers at springnote_request '''
         sign_token = self.format_token(sign_token or self.access_token)
         request = oauth.OAuthRequest.from_consumer_and_token(
             self.consumer_token, sign_token, method, url, params or {})
         request.sign_request(Springnote.signature_method, self.consumer_token, sign_token)
 
-        if is_verbose(verbose):
+        if is_verbose(verbose, self.verbose):
             print '>> oauth:'
             print ' * signature method :', Springnote.signature_method.get_name()
             print ' * consumer token :', (self.consumer_token.key, self.consumer_token.secret)
@@ -221,7 +1516,7 @@ class Springnote(object):
         return request
 
     def springnote_request(self, method, url, params={}, headers=None, body=None, 
-            sign_token=None, secure=False, verbose=False):
+            sign_token=None, secure=False, verbose=None):
         """ sends a request to springnote.com. Used in every case to communicate 
         with springnote.com, including both authentication and requesting for 
         springnote resources.
@@ -237,13 +1532,20 @@ class Springnote(object):
         >>> http_response = Springnote(access_token).springnote_request( \
                 "GET", "http://url.com/path")
         """
+        breaker = not is_dry_run(self.dry_run) and self.circuit_breaker
+        if breaker:
+            breaker.allow()
+        if self.rate_limiter and not is_dry_run(self.dry_run):
+            self.rate_limiter.acquire(note=(params or {}).get('domain'))
+
         oauth_request = self.oauth_request(method, url, params, \
             sign_token=(sign_token or self.access_token), verbose=verbose)
 
-        headers = Springnote.set_headers(headers, oauth_request, method, body)
         body    = Springnote.set_body(body)
+        headers = Springnote.set_headers(headers, oauth_request, method, body)
 
-        if is_verbose(verbose):
+        verbose = is_verbose(verbose, self.verbose)
+        if verbose:
             print '>> header:'
             for key, value in headers.iteritems():
                 print " *", key, ':', value
@@ -258,47 +1560,249 @@ class Springnote(object):
             if body: print 'body:', `body`
             print
 
-        # create http(s) connection and request
-        if is_verbose(verbose) and secure: print 'using HTTPS'
-        if secure:  conn = httplib.HTTPSConnection(HOST)
-        else:       conn = httplib.HTTPConnection(HOST)
-
-        # request
-        if default_dry_run: return
+        # get http(s) connection from pool and request
+        if verbose and secure: print 'using HTTPS'
+        if is_dry_run(self.dry_run): return
+        connect_timeout, read_timeout = self.timeouts()
+        started = time.time()
         try:
-            conn.request(oauth_request.http_method, oauth_request.http_url, 
-                        body=body, headers=headers)
+            response = self.send_over_pool(oauth_request, body, headers, 
+                    secure, connect_timeout, read_timeout, verbose)
+        except:
+            if breaker: breaker.record(False)
+            raise
+        if breaker: breaker.record(response.status < 500, time.time() - started)
+        return response
+
+    def send_over_pool(self, oauth_request, body, headers, secure=False, 
+            connect_timeout=None, read_timeout=None, verbose=None):
+        """ sends signed oauth_request on a connection from the pool, and 
+        returns the response. stale kept-alive connection is reconnected """
+        conn, reused = self.pool.acquire(HOST, secure)
+        try:
+            try:
+                ConnectionPool.set_timeouts(conn, connect_timeout, read_timeout)
+                conn.request(oauth_request.http_method, oauth_request.http_url, 
+                            body=body, headers=headers)
+                response = conn.getresponse()
+            except socket.timeout:
+                raise
+            except (socket.error, httplib.HTTPException):
+                if not reused: raise
+                # server has closed the kept-alive connection. reconnect once
+                if verbose: print 'reconnecting stale connection'
+                conn.close()
+                conn = self.pool.connect(HOST, secure)
+                if hasattr(body, 'seek'): body.seek(0)
+                ConnectionPool.set_timeouts(conn, connect_timeout, read_timeout)
+                conn.request(oauth_request.http_method, oauth_request.http_url, 
+                            body=body, headers=headers)
+                response = conn.getresponse()
         except socket.gaierror:
+            conn.close()
             raise SpringnoteError.NoNetwork("cannot reach '%s'" % oauth_request.http_url)
-        return conn.getresponse()
+        except socket.timeout:
+            conn.close()
+            raise SpringnoteError.Timeout("no response from '%s' in time" % oauth_request.http_url)
+        except:
+            conn.close()
+            raise
+
+        self.pool.release(HOST, secure, conn, response)
+        return response
+
+    def timeouts(self):
+        """ (connect_timeout, read_timeout) of a request, shortened to the 
+        time left of the Deadline. raises SpringnoteError.Timeout if there
+        is no time left """
+        connect_timeout, read_timeout = self.connect_timeout, self.read_timeout
+        deadline = Deadline.current()
+        if deadline is not None:
+            remaining = deadline.remaining()
+            if remaining <= 0:
+                raise SpringnoteError.Timeout("deadline has passed")
+            connect_timeout = min(connect_timeout or remaining, remaining)
+            read_timeout    = min(read_timeout    or remaining, remaining)
+        return connect_timeout, read_timeout
+
+    def map(self, requests, workers=None, ordered=True):
+        """ runs many requests concurrently, in at most `workers' threads 
+        sharing the connection pool of this client. workers defaults to the
+        max_limit of the client's ConcurrencyController, which then decides
+        how many are in flight, or 4 without one.
+
+        each request is a callable, or a tuple of (callable, args[, kwarg]).
+        returns an iterator of Future for each request, in the order given 
+        if ordered is True, or in the order they finish otherwise. an 
+        exception raised by a request is kept in its Future, without 
+        stopping the rest.
+
+        >> pages = [Page(sn, id=id) for id in ids]
+        >> for future in sn.map([page.get for page in pages], workers=8):
+        ..     if future.exception() is None: print future.result().title
+        """
+        executor = RequestExecutor(workers_for(self, workers))
+        finished = Queue.Queue()
+        futures  = []
+        try:
+            for request in requests:
+                if callable(request): request = (request,)
+                function = request[0]
+                args     = len(request) > 1 and request[1] or ()
+                kwarg    = len(request) > 2 and request[2] or {}
+                future = executor.submit(function, *args, **kwarg)
+                future.add_done_callback(finished.put)
+                futures.append(future)
+        finally:
+            executor.shutdown(wait=False)  # after the requests are done
+
+        if ordered:
+            return iter(futures)
+        return (finished.get() for future in futures)
 
     @staticmethod
     def set_headers(headers, oauth_request, method, body):
-        headers = headers or {}
+        headers = dict(headers or {})
         content_type = Springnote.DEFAULT_CONTENT_TYPE
         if is_file_type(body): # when POST or PUT attachment
             content_type = Springnote.MULTIPART_CONTENT_TYPE
         headers.setdefault('Content-Type', content_type)
+        if isinstance(body, MultipartBody):
+            headers['Content-Length'] = str(len(body))
 
         headers.update(oauth_request.to_header())
         return headers
 
     @staticmethod
     def wrap_file_to_body(data, boundary=BOUNDARY):
-        if is_file_type(data):
-            data = "\r\n".join([
-                '--%s' % boundary,
-                'Content-Disposition: form-data; name="Filedata"; filename="%s"' % data.name,
-                'Content-Transfer-Encoding: binary',
-                'Content-Type: application/octet-stream',
-                '',
-                data.read(),
-                '--%s--' % boundary,
-            ])
+        ''' wraps file into multipart body, which streams the file '''
+        if is_file_type(data) and not isinstance(data, MultipartBody):
+            data = MultipartBody(data, boundary)
         return data
     set_body = wrap_file_to_body
 
 
+def client_of(auth):
+    ''' returns the Springnote client to send requests with.
+
+    auth itself is used if it is a Springnote client, so that its tokens, 
+    connection pool and options are shared by every resource requested 
+    through it. otherwise a client is built from auth.access_token and 
+    auth.consumer_token '''
+    if isinstance(auth, Springnote):
+        return auth
+    return Springnote(auth.access_token, auth.consumer_token)
+
+
+def copy_resource(resource, auth=None, parent=None):
+    ''' copy of a resource, or a list of resources, that can be changed 
+    without touching the original. auth and parent are replaced if given '''
+    if isinstance(resource, types.ListType):
+        return [copy_resource(r, auth, parent) for r in resource]
+    new_resource = copy.copy(resource)
+    for attr in resource.springnote_attributes:
+        value = getattr(resource, attr, None)
+        if isinstance(value, types.ListType):
+            setattr(new_resource, attr, value[:])
+    if auth   is not None: new_resource.auth   = auth
+    if parent is not None: new_resource.parent = parent
+    return new_resource
+
+def apply_object_hook(obj, hook):
+    ''' obj with hook applied to each dict in it, innermost first, as the 
+    json decoder does with object_hook. for objects decoded without it '''
+    if isinstance(obj, types.DictType):
+        return hook(dict((key, apply_object_hook(value, hook)) for key, value in obj.iteritems()))
+    if isinstance(obj, types.ListType):
+        return [apply_object_hook(item, hook) for item in obj]
+    return obj
+
+JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+def iter_json_list(read, object_hook=None, chunk_size=64*1024):
+    ''' yields each item of the json list read by read(size), as soon as it
+    is read whole, decoded by the scanner of bundled simplejson (or json) 
+    with object_hook. chunk_size bytes are read at a time, and only the 
+    item being decoded is kept, not the whole list. 
+
+    raises SpringnoteError.ParseError if what is read is not a json list '''
+    decoder = (simplejson or stdlib_json).JSONDecoder(object_hook=object_hook)
+    buffer, pos, finished = '', 0, False
+    expected = '['      # '[', 'first' item or ']', 'item', or ',' or ']'
+    while True:
+        pos = JSON_WHITESPACE.match(buffer, pos).end()
+        complete = pos < len(buffer)
+        if complete and expected in ('first', 'item') and \
+                not (expected == 'first' and buffer[pos] == ']'):
+            try:
+                item, end = decoder.scan_once(buffer, pos)
+                # a number may go on in the next chunk
+                complete = end < len(buffer) or finished
+            except (StopIteration, ValueError):
+                if finished:
+                    raise SpringnoteError.ParseError('unable to load json item: ' + `buffer[pos:pos+100]`)
+                complete = False
+        if not complete:
+            if finished:
+                raise SpringnoteError.ParseError('json list ends unexpectedly')
+            # read at least as much as buffered, not to rescan a long item too often
+            chunk = read(max(chunk_size, len(buffer) - pos))
+            finished = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+
+        char = buffer[pos]
+        if expected == '[' and char == '[':
+            expected, pos = 'first', pos + 1
+        elif expected in ('first', 'next') and char == ']':
+            return
+        elif expected == 'next' and char == ',':
+            expected, pos = 'item', pos + 1
+        elif expected in ('first', 'item'):
+            expected, pos = 'next', end
+            yield item
+        else:
+            raise SpringnoteError.ParseError('unable to load json list at: ' + `buffer[pos:pos+100]`)
+
+def observed_request(client, **kwarg):
+    ''' client.springnote_request(**kwarg), sent when the ConcurrencyController
+    of the client allows, which then observes how it went '''
+    controller = getattr(client, 'concurrency', None)
+    if controller is None:
+        return client.springnote_request(**kwarg)
+    controller.acquire()
+    started, ok = time.time(), False
+    try:
+        response = client.springnote_request(**kwarg)
+        ok = response is None or response.status < 500
+        return response
+    finally:
+        controller.release(time.time() - started, ok)
+
+def hedged_request(client, **kwarg):
+    ''' observed_request(client, **kwarg), sent once more on another pooled 
+    connection if the HedgePolicy of the client finds the first late. the 
+    response which comes later is read to the end, to free its connection '''
+    hedge = getattr(client, 'hedge', None)
+    if hedge is None:
+        return observed_request(client, **kwarg)
+    def discard(response):
+        try:
+            if response is not None: response.read()
+        except (socket.error, httplib.HTTPException):
+            pass
+    return hedge.run(observed_request, (client,), kwarg, discard=discard)
+
+def workers_for(client, workers=None):
+    ''' number of threads for batch requests, unless workers is given. as 
+    many as the ConcurrencyController of the client may allow, or 4 '''
+    if workers: return workers
+    controller = getattr(client, 'concurrency', None)
+    if controller is not None:
+        return controller.max_limit
+    return 4
+
+
 ##
 ## -- OOP layer
 ##
@@ -327,29 +1831,111 @@ class SpringnoteResource(object):
     id = property(_get_id, _set_id)
 
     def request(self, path, method="GET", params={}, headers=None, data=None, 
-                process_response=True, verbose=None):
+                process_response=True, compress=None, hedge=False, verbose=None):
         ''' calls handle_request and build resource from output '''
         if data:
             data = self.to_json()
 
         instance = self.handle_request(auth=self.auth, parent=self.parent,
                     path=path, method=method, params=params, headers=headers, 
-                    data=data, process_response=process_response, verbose=verbose)
-        self.replace_with(instance)
+                    data=data, process_response=process_response, 
+                    compress=compress, hedge=hedge, verbose=verbose)
+        if instance is not None: # nothing is returned on dry run
+            self.replace_with(instance)
         return self
 
     @classmethod
     def handle_request(cls, auth, parent, path, method="GET", params={}, 
-                headers=None, data=None, process_response=True, verbose=None):
+                headers=None, data=None, process_response=True, compress=None,
+                hedge=False, verbose=None):
         """ send request to springnote.com and create resource from response.
             used by every subclass of SpringnoteResource 
+
+        identical GETs made at the same time through a client with 
+        SingleFlight share one request, and each gets a copy of the resource """
+        client = client_of(auth)
+        flight = getattr(client, 'single_flight', None)
+        if flight is None or method != "GET" or not process_response:
+            return cls._handle_request(client, auth, parent, path, method, 
+                    params, headers, data, process_response, compress, hedge,
+                    verbose)
+
+        key = (method, path, tuple(sorted((params or {}).items())), 
+               getattr(client.access_token, 'key', None))
+        instance = flight.do(key, cls._handle_request, client, auth, parent, 
+                path, method, params, headers, data, process_response, 
+                compress, hedge, verbose)
+        if instance is None: return # nothing is returned on dry run
+        return copy_resource(instance, auth, parent)
+
+    @classmethod
+    def _handle_request(cls, client, auth, parent, path, method, params, 
+                headers, data, process_response, compress, hedge, verbose):
+        verbose = is_verbose(verbose, client.verbose)
+
+        # ask conditionally if resource is in cache
+        cache, cached = getattr(client, 'cache', None), None
+        if cache is not None:
+            key = (getattr(client.access_token, 'key', None), path)
+            if method != "GET" or not process_response:
+                cache.discard(key)
+                cache = None
+            else:
+                cached = cache.get(key)
+        if cached is not None:
+            etag, last_modified, resource = cached
+            headers = dict(headers or {})
+            if etag:          headers['If-None-Match']     = etag
+            if last_modified: headers['If-Modified-Since'] = last_modified
+
+        response = cls.send_request(client, path, method, params, headers, 
+                                    data, compress=compress, hedge=hedge,
+                                    verbose=verbose,
+                                    not_modified=cached is not None)
+        if response is None: return # nothing is returned on dry run
+
+        # handle response
+        data = read_body(response, client.read_timeout)
+        if response.status == httplib.NOT_MODIFIED:
+            if verbose: print '<< not modified, using cache'
+            return copy_resource(resource, auth, parent)
+        if not process_response: 
+            new_instance = cls(auth=auth, parent=parent)
+            new_instance.raw = data
+            return new_instance
+        instance = cls.from_json(data, auth, parent, verbose=verbose)
+
+        if cache is not None:
+            etag, last_modified = response.getheader('etag'), response.getheader('last-modified')
+            if etag or last_modified:
+                cache.put(key, etag, last_modified, instance)
+        return instance
+
+    @classmethod
+    def send_request(cls, client, path, method="GET", params={}, headers=None, 
+                data=None, compress=None, hedge=False, verbose=None, 
+                not_modified=False):
+        """ send request to springnote.com through client, and return the 
+        response unread. raises SpringnoteError.Response unless it is OK, or 
+        Not Modified when not_modified is True. returns None on dry run
+
+        response is asked to be compressed if compress is True, or if it is
+        None and the client compresses, and is decompressed as it is read.
+        GET is hedged by the HedgePolicy of the client if hedge is True.
             
         note that HTTPS won't work. always use HTTP """
 
         url  = "http://%s/%s" % (HOST, path.lstrip('/'))
         use_https = False       # this should always be False
 
-        if is_verbose(verbose):
+        if compress is None: 
+            compress = getattr(client, 'compress', False)
+        if compress:
+            headers = dict(headers or {})
+            headers['Accept-Encoding'] = 'gzip, deflate'
+
+        verbose = is_verbose(verbose, client.verbose)
+        if verbose:
             print '>> content'
             print ' * HTTP method:', method
             print ' * params:',      params
@@ -358,29 +1944,48 @@ class SpringnoteResource(object):
             print ' * headers:',     headers
             print ' * data:',        data
 
-        # send request
-        response = Springnote(auth.access_token, auth.consumer_token) \
-            .springnote_request(
-                method  = method,
-                url     = url,
-                params  = params,
-                headers = headers,
-                body    = data,
-                secure  = use_https, 
-                verbose = verbose
-        )
-
-        if default_dry_run: return
+        # send request, again and again if it fails and retry says so
+        retry, attempt = getattr(client, 'retry', None), 0
+        if retry: retry.started()
+        if hedge and method == "GET": send = hedged_request
+        else:                         send = observed_request
+        while True:
+            try:
+                response = send(client,
+                        method  = method,
+                        url     = url,
+                        params  = params,
+                        headers = headers,
+                        body    = data,
+                        secure  = use_https, 
+                        verbose = verbose
+                )
+            except (SpringnoteError.NoNetwork, socket.error, httplib.HTTPException):
+                if not (retry and retry.should_retry(method, data, attempt)): 
+                    raise
+                delay = retry.delay(attempt)
+            else:
+                if is_dry_run(client.dry_run): return
+                if compress:
+                    response = decoded(response)
+                if not (retry and response.status in retry.statuses and 
+                        retry.should_retry(method, data, attempt)):
+                    break
+                delay = retry.delay(attempt, response.getheader('retry-after'))
+                response.read() # let the connection be reused
+            attempt += 1
+            deadline = Deadline.current()
+            if deadline is not None and delay >= deadline.remaining():
+                raise SpringnoteError.Timeout("deadline passes before retrying %s %s" % (method, url))
+            if verbose: print 'retrying in %.2f seconds (%d)' % (delay, attempt)
+            retry.sleep(delay)
+            if hasattr(data, 'seek'): data.seek(0)
+
+        if response.status == httplib.NOT_MODIFIED and not_modified:
+            return response
         if response.status != httplib.OK:
             raise SpringnoteError.Response(response, 'failed to %s %s' % (method,url))
-
-        # handle response
-        data = response.read()
-        if not process_response: 
-            new_instance = cls(auth=auth, parent=parent)
-            new_instance.raw = data
-            return new_instance
-        return cls.from_json(data, auth, parent, verbose=verbose)
+        return response
 
     def to_json(self, data=None):
         ''' wraps data into json format '''
@@ -412,38 +2017,61 @@ class SpringnoteResource(object):
             print data
             print
 
-        # build proper object
-        object_name = cls.__name__.lower() # Page => 'page'
+        # build proper object, as soon as each is decoded
+        hook = cls.object_hook(auth, parent)
         try:
-            structure = json.loads(data)
+            structure = json.loads(data, object_hook=hook)
         except ValueError:
             raise SpringnoteError.ParseError('unable to load json: ' + `data`)
 
+        # build single data - {'page': {'id':3}} or {'id':3}
         if isinstance(structure, types.DictType):
-            # build single data - {'page': {'id':3}}
-            if object_name in structure:
-                new_instance = cls(auth=auth, parent=parent)
-                new_instance.raw = data
-
-                # process resource specific tasks
-                new_instance._set_resource(structure[object_name])
-                return new_instance
-
-            # wrap with object name if not given and retry - {'id':3}
-            else:
-                wrapped_data = '{"%s": %s}' % (object_name, data)
-                new_instance = cls.from_json(wrapped_data, auth, parent, verbose=verbose)
-                new_instance.raw = data
-                return new_instance
+            structure = apply_object_hook(structure, hook)
+        if isinstance(structure, cls):
+            structure.raw = data
+            return structure
 
         # build multiple resources - [{'page': {'id':3}}, {'page': {'id':4}}]
         elif type(structure) is list:
-            build = lambda d: cls.from_json(json.dumps(d, ensure_ascii=False),
-                                            auth, parent, verbose=verbose)
-            return map(build, structure)
+            resources = [apply_object_hook(d, hook) for d in structure]
+            for resource in resources:
+                if not isinstance(resource, cls): break
+            else:
+                return resources
 
         raise SpringnoteError.ParseError('unable to build resource from: ' + data)
 
+    @classmethod
+    def object_hook(cls, auth, parent=None):
+        """ object_hook for the json decoder, which builds the resource from 
+        its object as soon as it is decoded, either {'id':3} or the one 
+        wrapped in the name of the resource, {'page': {'id':3}}. 
+
+        raw of the resource is encoded from the object decoded, as it was in
+        the response, only when asked """
+        object_name = cls.__name__.lower() # Page => 'page'
+        def build(obj):
+            if len(obj) == 1 and isinstance(obj.get(object_name), cls):
+                instance = obj[object_name]
+                if instance._raw is None:
+                    instance._structure = {object_name: instance._structure}
+                return instance
+            new_instance = cls(auth=auth, parent=parent)
+            new_instance._raw, new_instance._structure = None, obj
+            # process resource specific tasks
+            new_instance._set_resource(obj)
+            return new_instance
+        return build
+
+    def _get_raw(self):
+        if self._raw is None: # built by object_hook, encoded when first asked
+            self._raw = json.dumps(self._structure, ensure_ascii=False)
+            self._structure = None
+        return self._raw
+    def _set_raw(self, raw):
+        self._raw, self._structure = raw, None
+    raw = property(_get_raw, _set_raw)
+
     def replace_with(self, obj):
         ''' copy springnote_attributes and raw from object given '''
         for attr in self.springnote_attributes:
@@ -457,8 +2085,13 @@ class SpringnoteResource(object):
 
     @staticmethod
     def _to_unicode(s):
-        ''' '\\uc2a4\\ud504\\ub9c1\\ub178\\ud2b8' => u"스프링노트" '''
+        ''' '\\uc2a4\\ud504\\ub9c1\\ub178\\ud2b8' => u"스프링노트" 
+
+        str, which some json codecs decode ascii strings to, is decoded as 
+        utf-8 so that attributes are unicode whichever codec is used '''
         #return eval('u"""%s"""' % s)
+        if isinstance(s, str):
+            s = s.decode('utf-8')
         def repl(match):
             return unichr(int(match.group(1), 16))
         return re.sub(r"\\u([0-9a-fA-F]{4})", repl, s)
@@ -567,8 +2200,8 @@ class SpringnoteResource(object):
         if format:      path += ".json"         # ../attachments/456.json
 
         # update parameters
-        params['note'] = page.note
-        params = cls._update_params(params.copy())
+        params = dict(params, note=page.note)
+        params = cls._update_params(params)
 
         # apply parameters to path
         if params:  
@@ -617,7 +2250,7 @@ class Page(SpringnoteResource):
         'tags'     : lambda x: types.UnicodeType(x),
         'identifiers': lambda x: re.match("([0-9]+,)*[0-9]+", str(x)).group(0), 
     }
-    request_methods = ['get', 'save', 'delete', 'list', 
+    request_methods = ['get', 'save', 'delete', 'list', 'iter_list',
         'search', 'get_root', 'get_parent', 'get_children',
     ]
 
@@ -655,7 +2288,10 @@ class Page(SpringnoteResource):
         """ add feature: convert content of .tags to list """
         super(Page, self)._set_resource(resource_dict)
         if "tags" in resource_dict:
-            self._set_tags(resource_dict["tags"])
+            tags = resource_dict["tags"]
+            if isinstance(tags, types.StringTypes):
+                tags = self._to_unicode(tags)
+            self._set_tags(tags)
     resource = property(_get_resource, _set_resource)
 
     @classmethod
@@ -705,7 +2341,7 @@ class Page(SpringnoteResource):
         hence the page instance MUST have id attribute """
         self.requires_value_for('id')
         path, params = self._set_path_params(self, id=self.id, note=self.note)
-        return self.request(path, "GET", params=params, verbose=verbose)
+        return self.request(path, "GET", params=params, hedge=True, verbose=verbose)
 
     def save(self, verbose=None):
         """ save current page, either create or update.
@@ -748,7 +2384,114 @@ class Page(SpringnoteResource):
 
         return pages
 
+    @classmethod
+    def iter_list(cls, auth, note=None, link_parents=True, chunk_size=64*1024,
+                    verbose=None, **kwarg):
+        ''' yield pages that match the criteria one at a time, as list()
+        returns them, decoded as the response is read. pages of a large note
+        are enumerated without holding the response or its json as a whole.
+        the cache and SingleFlight of the client are not used
+
+        parent of each page is connected once the parent has been read,
+        which may be after the page is yielded. pages are kept for this
+        unless link_parents is False
+
+        >> for page in Page.iter_list(sn, note='jangxyz'):
+        ..     print page.id, page.title
+        '''
+        kwarg.update(id=None)
+        if note: kwarg.update(note=note)
+
+        path, params = Page._set_path_params(**kwarg) # ignores id
+        client   = client_of(auth)
+        response = cls.send_request(client, path, "GET", params, verbose=verbose)
+        if response is None: return # nothing is yielded on dry run
+
+        pages, orphans = {}, {} # id => page, parent id => [pages waiting]
+        read = lambda size: read_in_time(response, size, client.read_timeout)
+        finished = False
+        try:
+            for page in iter_json_list(read, cls.object_hook(auth), chunk_size):
+                if not isinstance(page, cls):
+                    raise SpringnoteError.ParseError('unable to build page from: ' + `page`)
+                if link_parents:
+                    cls._link_parent(page, pages, orphans)
+                yield page
+            # only blanks may follow the list. read them to reuse the connection
+            while read(chunk_size): pass
+            finished = True
+        finally:
+            # rest of the list is not downloaded when stopped early or failed
+            if not finished:
+                response.close()
+                client.pool.discard(response)
+
+    @staticmethod
+    def _link_parent(page, pages, orphans):
+        ''' connect page to its parent and its children among pages read so
+        far, as list() does. children whose parent is not read yet wait in
+        orphans '''
+        parent_id   = page.relation_is_part_of
+        page.parent = pages.get(parent_id, None)
+        if page.parent is None and parent_id is not None:
+            orphans.setdefault(parent_id, []).append(page)
+        if page.id not in pages:
+            pages[page.id] = page
+            for child in orphans.pop(page.id, []):
+                child.parent = page
+
     # additional methods
+    @classmethod
+    def get_many(cls, auth, ids, note=None, chunk_size=50, workers=None, verbose=None):
+        ''' get pages of given ids, using list(identifiers=) method.
+
+        ids are sent in chunks of at most chunk_size ids, each short enough
+        to fit in an URL, and the chunks are requested concurrently.
+        returns pages in the order of ids, with None in place of any page
+        springnote.com did not return.
+        '''
+        ids    = [int(id) for id in ids]
+        chunks = cls._chunk_identifiers(ids, chunk_size)
+
+        fetch = lambda chunk: cls.list(auth, note=note, verbose=verbose,
+                                identifiers=",".join(map(str, chunk)))
+        if len(chunks) <= 1:
+            results = map(fetch, chunks)
+        else:
+            workers  = workers_for(client_of(auth), workers)
+            executor = RequestExecutor(min(workers, len(chunks)))
+            try:
+                futures = [executor.submit(fetch, chunk) for chunk in chunks]
+                results = [future.result() for future in futures]
+            finally:
+                executor.shutdown(wait=False)
+
+        # order by ids given, and connect parents across chunks
+        page_dictionary = {}
+        for pages in results:
+            for page in pages:
+                page_dictionary.setdefault(page.id, page)
+        for page in page_dictionary.itervalues():
+            page.parent = page_dictionary.get(page.relation_is_part_of, None)
+
+        return [page_dictionary.get(id, None) for id in ids]
+
+    @staticmethod
+    def _chunk_identifiers(ids, chunk_size=50, max_length=1024):
+        ''' split ids into lists of at most chunk_size ids, each not longer
+        than max_length when joined by comma '''
+        chunks, chunk, length = [], [], 0
+        for id in ids:
+            id_length = len(str(id)) + 1  # with comma
+            if chunk and (len(chunk) >= chunk_size or length + id_length > max_length):
+                chunks.append(chunk)
+                chunk, length = [], 0
+            chunk.append(id)
+            length += id_length
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
     @classmethod
     def search(cls, auth, query, note=None, verbose=None, **kwarg):
         ''' search page for given query. using list() method '''
@@ -797,16 +2540,28 @@ class Attachment(SpringnoteResource):
         # file attributes
         self.title = filename
         self.content, self.description, self.date_created = None, None, None
+        self._file = None   # file on disk to upload
         if file:     
             self._set_file(file)
 
     def _set_file(self, file):
-        ''' set title, content, description '''
+        ''' set title, description, and content unless file is on disk. 
+        file on disk is kept to be streamed on upload, not read here, from
+        where it is now on every upload '''
         self.title       = file.name
-        self.content     = file.read()
-        self.description = len(self.content)
+        self.content     = None
+        self.description = file_size(file)
+        self._file       = file
+        self._file_start = self.description is not None and file.tell() or 0
+        if self.description is None: # cannot tell size without reading it
+            self.content     = file.read()
+            self.description = len(self.content)
+            self._file       = None
     def _get_file(self):
-        ''' return a fake file object with name and read() it '''
+        ''' return the file on disk if given, or a fake file object with 
+        name and read() it '''
+        if self._file is not None:
+            return self._file
         class File:
             def __init__(self, name, content):
                 self.name = name
@@ -824,6 +2579,8 @@ class Attachment(SpringnoteResource):
 
     def to_json(self):
         ''' Attachment.to_json only needs to wrap file object into json '''
+        if self._file is not None: # may be read to the end by last upload
+            self._file.seek(self._file_start)
         return Springnote.wrap_file_to_body(self.file)
 
     @classmethod
@@ -837,17 +2594,57 @@ class Attachment(SpringnoteResource):
         requires id and parent.id """
         self.requires_value_for('id', 'parent.id')
         path, params = self._set_path_params(self.parent, self.id, format=True)
-        self.request(path, "GET", params, verbose=verbose)
+        self.request(path, "GET", params, hedge=True, verbose=verbose)
 
     def download(self, filename=None, verbose=None):
         """ fetch the attachment file. requires id and parent.id """
         self.requires_value_for('id', 'parent.id')
         path, params = self._set_path_params(self.parent, self.id, format=False)
-        self.request(path, "GET", params, process_response=False, verbose=verbose)
+        self.request(path, "GET", params, process_response=False, 
+                        compress=False, verbose=verbose)
         self.content = self.raw
 
         return self
 
+    def download_to(self, target, chunk_size=64*1024, verbose=None):
+        """ fetch the attachment file and write it to target, a file name or
+        a file object, chunk_size bytes at a time. requires id and parent.id
+
+        the file is never held in memory as a whole. received size is
+        checked against description (or Content-Length if description is
+        unknown), and SpringnoteError.SizeMismatch is raised if it differs;
+        file written by name is removed in that case """
+        self.requires_value_for('id', 'parent.id')
+        path, params = self._set_path_params(self.parent, self.id, format=False)
+        client   = client_of(self.auth)
+        response = self.send_request(client, path, "GET", params, 
+                                        compress=False, verbose=verbose)
+        if response is None: return self # nothing is written on dry run
+
+        expected = self.description or response.getheader('content-length')
+        opened   = isinstance(target, types.StringTypes)
+        if opened:
+            target = open(target, 'wb')
+        try:
+            size = 0
+            while True:
+                chunk = read_in_time(response, chunk_size, client.read_timeout)
+                if not chunk: break
+                target.write(chunk)
+                size += len(chunk)
+            if expected is not None and size != int(expected):
+                raise SpringnoteError.SizeMismatch(
+                    "received %d bytes of %s, expected %s" % (size, self.id, expected))
+        except:
+            if opened:
+                target.close()
+                os.remove(target.name)
+            raise
+        if opened:
+            target.close()
+
+        return self
+
     def delete(self, verbose=None):
         """ delete the attachment. requires id and parent.id """
         self.requires_value_for('id', 'parent.id')
@@ -924,7 +2721,7 @@ class Lock(SpringnoteResource):
         """ fetch status of lock """
         self.requires_value_for('parent.id')
         path, params = self._set_path_params(self.parent, plural=False)
-        return self.request(path, "GET", params, verbose=verbose)
+        return self.request(path, "GET", params, hedge=True, verbose=verbose)
 
     def acquire(self, verbose=None):
         """ try to acquire a lock to edit page (POST) """
@@ -998,11 +2795,13 @@ def register_request_methods(parent, *children):
 
     read request methods from children resources, and
     generate a 'request_resource' style method and bind it to the parent.
+    returns the names of methods bound.
 
     examples:
      * page.get_attachment()        is  Attachment(page).get()
      * sn.list_pages(verbose=True)  is  Page.list(sn, verbose=True)
     '''
+    method_names = []
     def generate_method(method_name, resource, method):
         return lambda parent, *args, **kwarg: \
                     run_resource_method(parent, method_name, resource, method, 
@@ -1018,8 +2817,96 @@ def register_request_methods(parent, *children):
             method = generate_method(method_name, child, request_method)
             setattr(parent, method_name, method)     # eg, Page.get_lock
             setattr(method, '__name__', method_name) # eg, Page.get_lock.__name__
+            method_names.append(method_name)
+    return method_names
 
 # bind request methods to parent resource
-register_request_methods(Springnote, Page)
-register_request_methods(Page, Attachment, Comment, Lock, Revision, Collaboration)
+springnote_request_methods = register_request_methods(Springnote, Page)
+page_request_methods = register_request_methods(Page, Attachment, Comment, 
+                                            Lock, Revision, Collaboration)
 
+
+class AsyncSpringnote(Springnote):
+    ''' Springnote client whose request methods return a Future at once, 
+    instead of blocking until the response arrives.
+
+    requests run in a fixed pool of `workers' worker threads sharing the 
+    client's connection pool, so thousands of requests can be issued from
+    one process without a thread per request. as many as the 
+    ConcurrencyController given as concurrency allows if workers is not
+    given, or 8. other options are those of Springnote
+
+    >> sn = AsyncSpringnote(access_token, workers=16)
+    >> futures = [sn.get_page(id=id) for id in ids]
+    >> pages = [future.result() for future in futures]
+
+    request methods of pages built with the client, such as 
+    page.get_attachment() or page.list_revisions(), return a Future too. 
+    methods of the resources themselves, such as page.save() or 
+    attachment.download(), still block. run them in the background with
+    submit():
+
+    >> future = page.get_attachment(id=456)
+    >> sn.submit(page.save)
+    '''
+    def __init__(self, *args, **kwarg):
+        workers = kwarg.pop('workers', None)
+        Springnote.__init__(self, *args, **kwarg)
+        if workers is None and self.concurrency is None:
+            workers = 8
+        self.executor = RequestExecutor(workers_for(self, workers))
+
+    def submit(self, function, *args, **kwarg):
+        ''' run function(*args, **kwarg) in background and return its Future '''
+        return self.executor.submit(function, *args, **kwarg)
+
+    def close(self):
+        ''' wait for the requests submitted and close every connection '''
+        self.executor.shutdown()
+        self.pool.clear()
+
+def register_async_methods(cls, method_names):
+    ''' wraps blocking methods of Springnote to run in background of cls,
+    returning Future instead of the result '''
+    def generate_method(method_name):
+        blocking = getattr(Springnote, method_name)
+        return lambda self, *args, **kwarg: \
+                    self.submit(blocking, self, *args, **kwarg)
+    for method_name in method_names:
+        method = generate_method(method_name)
+        setattr(method, '__name__', method_name)
+        setattr(cls, method_name, method)
+
+def register_async_resource_methods(cls, method_names):
+    ''' wraps request methods of resource cls to return Future instead of the
+    result when the resource is built with an AsyncSpringnote. they block as
+    before for other clients, and in the workers of the client, which would
+    otherwise wait for themselves '''
+    def generate_method(method_name):
+        blocking = getattr(cls, method_name)
+        def method(self, *args, **kwarg):
+            client = self.auth
+            if isinstance(client, AsyncSpringnote) and not client.executor.in_worker():
+                return client.submit(blocking, self, *args, **kwarg)
+            return blocking(self, *args, **kwarg)
+        return method
+    for method_name in method_names:
+        method = generate_method(method_name)
+        setattr(method, '__name__', method_name)
+        setattr(cls, method_name, method)
+
+# generators such as iter_list_pages are iterated by the caller as they are
+register_async_methods(AsyncSpringnote, ['fetch_request_token', 
+    'fetch_access_token'] + [name for name in springnote_request_methods 
+                                if not name.startswith('iter_')])
+register_async_resource_methods(Page, [name for name in page_request_methods
+                                if not name.startswith('iter_')])
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['--build-speedups']:
+        if not build_json_speedups():
+            sys.exit("cannot build C speedups of simplejson in %s" % BUNDLED_SIMPLEJSON)
+        print 'built C speedups of simplejson in', BUNDLED_SIMPLEJSON
+    else:
+        sys.exit("usage: python springnote.py --build-speedups")
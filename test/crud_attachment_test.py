@@ -5,7 +5,7 @@
 import test_env
 from test_env import *
 
-import unittest, __builtin__
+import unittest, __builtin__, StringIO, tempfile, os
 
 from pmock import *
 from pmock_xtnd import *
@@ -222,9 +222,9 @@ class AttachmentAuthTestCase(unittest.TestCase):
 
         page = springnote.Page(auth, id=1)
         attach = springnote.Attachment(auth=new_auth, parent=page)
-        should_call_method(springnote, 'Springnote',
+        should_call_method(springnote, 'client_of',
             when = lambda: attach.request("some/path"),
-            arg  = with_(eq(new_auth.access_token), eq(new_auth.consumer_token)))
+            arg  = with_(same(new_auth)))
 
     @unittest.test
     def use_tokens_from_parent_if_not_given(self):
@@ -234,9 +234,9 @@ class AttachmentAuthTestCase(unittest.TestCase):
 
         page = springnote.Page(auth, id=1)
         attach = springnote.Attachment(auth=None, parent=page)
-        should_call_method(springnote, 'Springnote',
+        should_call_method(springnote, 'client_of',
             when = lambda: attach.request("some/path"),
-            arg  = with_(eq(auth.access_token), eq(auth.consumer_token)))
+            arg  = with_(same(auth)))
 
 
 class AttachmentDownloadTestCase(unittest.TestCase):
@@ -296,12 +296,77 @@ class AttachmentDownloadTestCase(unittest.TestCase):
         id_less_attach = springnote.Attachment(self.page, id=None)
         should_raise(springnote.SpringnoteError.InvalidOption, when=run)
 
+class AttachmentDownloadToTestCase(unittest.TestCase):
+    class Response:
+        ''' http response that gives out body in pieces '''
+        status = 200
+        def __init__(self, body): self.body = StringIO.StringIO(body)
+        def read(self, size=-1):  return self.body.read(size)
+        def getheader(self, name, default=None): return default
+
+    def setUp(self):
+        self.content = 'FILE CONTENT' * 100
+        self.sn = springnote.Springnote()
+        self.sn.springnote_request = \
+            lambda *args, **kwarg: self.Response(self.content)
+        self.page   = springnote.Page(self.sn, id=1)
+        self.attach = springnote.Attachment(self.page, id=123)
+
+    @unittest.test
+    def download_to_writes_file_content_to_file_object(self):
+        ''' download_to(file) writes response to file, chunk by chunk '''
+        written = []
+        target  = Mock()
+        target.write = written.append
+        self.attach.download_to(target, chunk_size=500)
+
+        assert_that(''.join(written), is_(self.content))
+        assert_that(written, has_length(3))
+        assert_that(self.attach.content, is_(None))
+
+    @unittest.test
+    def download_to_checks_size(self):
+        ''' download_to() raises SizeMismatch and removes file if size differs from description '''
+        self.attach.description = len(self.content) + 1
+        filename = tempfile.mktemp()
+        should_raise(springnote.SpringnoteError.SizeMismatch, 
+                    when=lambda: self.attach.download_to(filename))
+        assert_that(os.path.exists(filename), is_(False))
+
+class AttachmentUploadTestCase(unittest.TestCase):
+    def setUp(self):
+        self.bodies = []
+        def springnote_request(*args, **kwarg):
+            self.bodies.append(kwarg['body'].read())
+            response = Mock()
+            response.status = 200
+            response.read   = lambda: sample_json
+            return stub_headers(response)
+        self.sn = springnote.Springnote()
+        self.sn.springnote_request = springnote_request
+        self.page = springnote.Page(self.sn, id=1)
+
+    @unittest.test
+    def file_on_disk_is_uploaded_whole_every_time(self):
+        ''' upload() twice sends the file from where it was given, both times '''
+        file_obj = tempfile.NamedTemporaryFile()
+        file_obj.write('HEADER' + 'FILE CONTENT' * 10)
+        file_obj.seek(len('HEADER'))
+        attach = springnote.Attachment(self.page, file=file_obj)
+        attach.upload()
+        attach.upload()
+
+        assert_that(self.bodies, has_length(2))
+        assert_that(self.bodies[0], string_contains('FILE CONTENT' * 10))
+        assert_that(self.bodies[0], is_not(string_contains('HEADER')))
+        assert_that(self.bodies[1], is_(self.bodies[0]))
+
 class AttributeConvertTestCase(unittest.TestCase):
     def setUp(self):
         self.o_Springnote = springnote.Springnote
 
         # mock objects
-        springnote.Springnote = CMock()
+        springnote.Springnote = SpringnoteCMock()
         self.m_get_response   = Mock()
 
         # default Springnote.springnote_request behavior
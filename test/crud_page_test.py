@@ -5,7 +5,7 @@
 import test_env
 from test_env import *
 
-import unittest, re, __builtin__
+import unittest, re, urllib, __builtin__, StringIO, gzip, zlib, threading, time
 from pmock import *
 from pmock_xtnd import *
 
@@ -399,6 +399,358 @@ class PageRequestTestCase(unittest.TestCase):
             arg  = with_at_least(method=eq("GET"), url=string_contains(url_pattern)),
         )
 
+class ClientReuseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.response = Mock()
+        self.response.status = 200
+        stub_headers(self.response)
+        self.response.read = lambda: sample_json
+
+    @unittest.test
+    def request_is_sent_through_the_client_given_as_auth(self):
+        ''' Page(sn).get() sends request with sn itself, not a new Springnote '''
+        sn   = springnote.Springnote()
+        sent = []
+        def springnote_request(*args, **kwarg):
+            sent.append(kwarg)
+            return self.response
+        sn.springnote_request = springnote_request
+
+        springnote.Page(sn, id=4).get()
+        springnote.Page(sn, id=4).get()
+        assert_that(sent, has_length(2))
+
+    @unittest.test
+    def options_of_client_subclass_are_used(self):
+        ''' options of a Springnote subclass, set as properties, are read from the client '''
+        class CompressedClient(springnote.Springnote):
+            compress = property(lambda self: True, lambda self, value: None)
+        sn   = CompressedClient(compress=False)
+        sent = []
+        sn.springnote_request = lambda *args, **kwarg: sent.append(kwarg) or self.response
+        assert_that(springnote.client_of(sn), is_(sn))
+        springnote.Page(sn, id=4).get()
+        assert_that(sent[0]['headers'], has_entry('Accept-Encoding', 'gzip, deflate'))
+
+    @unittest.test
+    def client_is_built_from_tokens_if_auth_is_not_a_client(self):
+        ''' client_of(auth) builds Springnote with auth tokens '''
+        auth = Mock()
+        auth.access_token   = ('ACCESS', 'TOKEN')
+        auth.consumer_token = ('CONSUMER', 'TOKEN')
+        client = springnote.client_of(auth)
+        assert_that(client, instance_of(springnote.Springnote))
+        assert_that(client.access_token.key, is_('ACCESS'))
+
+    @unittest.test
+    def dry_run_of_client_does_not_send_request(self):
+        ''' Springnote(dry_run=True) does not send requests, regardless of default_dry_run '''
+        sn = springnote.Springnote(dry_run=True)
+        sn.pool = Mock() # any access to pool fails
+        assert_that(springnote.Page(sn, id=123).get().id, is_(123))
+
+
+class CompressionTestCase(unittest.TestCase):
+    def compressed_response(self, body, encoding):
+        if encoding == 'gzip':
+            buf  = StringIO.StringIO()
+            gzip_file = gzip.GzipFile(fileobj=buf, mode='wb')
+            gzip_file.write(body)
+            gzip_file.close()
+            body = buf.getvalue()
+        else:
+            body = zlib.compress(body)
+        content  = StringIO.StringIO(body)
+        response = Mock()
+        response.status = 200
+        response.read   = lambda size=-1: content.read(size)
+        return stub_headers(response, {'Content-Encoding': encoding})
+
+    def client(self, encoding, **kwarg):
+        sn = springnote.Springnote(**kwarg)
+        self.sent = []
+        def springnote_request(*args, **kwarg):
+            self.sent.append(kwarg)
+            return self.compressed_response(sample_json, encoding)
+        sn.springnote_request = springnote_request
+        return sn
+
+    @unittest.test
+    def compressed_response_is_decompressed(self):
+        ''' Page.get() asks for compression, and reads gzip or deflate body '''
+        for encoding in ['gzip', 'deflate']:
+            page = springnote.Page(self.client(encoding), id=4).get()
+            assert_that(page.title, is_("TestPage"))
+            assert_that(self.sent[0]['headers'], has_entry('Accept-Encoding', 'gzip, deflate'))
+
+    @unittest.test
+    def decompressed_body_is_read_in_pieces(self):
+        ''' decoded response returns the body piece by piece in the sizes asked, across chunks '''
+        body = ''.join(['%05d,' % i for i in range(20000)])
+        for encoding in ['gzip', 'deflate']:
+            response = springnote.decoded(self.compressed_response(body, encoding))
+            response.block_size = 1000
+            pieces = []
+            for size in [1, 7, 4096, 65536, 3]:
+                pieces.append(response.read(size))
+                assert_that(len(pieces[-1]), is_(size))
+            pieces.append(response.read())
+            assert_that(response.read(10), is_(''))
+            assert_that(''.join(pieces), is_(body))
+
+    @unittest.test
+    def compression_is_not_asked_if_client_does_not_compress(self):
+        ''' Springnote(compress=False) does not send Accept-Encoding '''
+        sn   = springnote.Springnote(compress=False)
+        sent = []
+        response = Mock()
+        response.status = 200
+        response.read   = lambda: sample_json
+        sn.springnote_request = lambda *args, **kwarg: sent.append(kwarg) or response
+
+        springnote.Page(sn, id=4).get()
+        assert_that(sent[0]['headers'] or {}, is_not(has_key('Accept-Encoding')))
+
+class ValidatorCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.sn = springnote.Springnote(cache=springnote.ValidatorCache())
+        self.sent, self.statuses = [], [200, 304]
+        def springnote_request(*args, **kwarg):
+            self.sent.append(kwarg)
+            response = Mock()
+            response.status = self.statuses.pop(0)
+            response.read   = lambda: response.status == 200 and sample_json or ''
+            return stub_headers(response, {'ETag': '"abc"'})
+        self.sn.springnote_request = springnote_request
+
+    @unittest.test
+    def not_modified_page_is_served_from_cache(self):
+        ''' second Page.get() is asked with If-None-Match, and 304 is served from cache '''
+        springnote.Page(self.sn, id=4).get()
+        page = springnote.Page(self.sn, id=4).get()
+
+        assert_that(self.sent[1]['headers'], has_entry('If-None-Match', '"abc"'))
+        assert_that(page.title, is_("TestPage"))
+
+    @unittest.test
+    def page_from_cache_is_a_copy(self):
+        ''' changing the page returned does not change the cache '''
+        page = springnote.Page(self.sn, id=4).get()
+        page.tags.append('changed')
+        page = springnote.Page(self.sn, id=4).get()
+        assert_that(page.tags, is_(['test']))
+
+class SingleFlightTestCase(unittest.TestCase):
+    def setUp(self):
+        self.flight = springnote.SingleFlight()
+        self.sn = springnote.Springnote(single_flight=self.flight)
+        self.sent, self.release = [], threading.Event()
+        def springnote_request(*args, **kwarg):
+            self.sent.append(kwarg)
+            self.release.wait()
+            response = Mock()
+            response.status = 200
+            response.read   = lambda: sample_json
+            return stub_headers(response)
+        self.sn.springnote_request = springnote_request
+
+    def get_in_thread(self, pages):
+        thread = threading.Thread(
+            target=lambda: pages.append(springnote.Page(self.sn, id=4).get()))
+        thread.start()
+        return thread
+
+    @unittest.test
+    def identical_gets_in_flight_share_a_request(self):
+        ''' two Page.get() at once send one request, and get their own copies '''
+        pages = []
+        first = self.get_in_thread(pages)
+        while not self.sent: time.sleep(0.01)
+        second = self.get_in_thread(pages)
+        while not self.flight.stats['shared']: time.sleep(0.01)
+        self.release.set()
+        first.join(); second.join()
+
+        assert_that(self.sent, has_length(1))
+        assert_that(pages,     has_length(2))
+        assert_that(pages[0].title, is_("TestPage"))
+        assert_that(pages[1].title, is_("TestPage"))
+        pages[0].tags.append('changed')
+        assert_that(pages[1].tags, is_(['test']))
+
+    @unittest.test
+    def finished_get_is_not_shared(self):
+        ''' Page.get() after the first is done sends a request of its own '''
+        self.release.set()
+        springnote.Page(self.sn, id=4).get()
+        springnote.Page(self.sn, id=4).get()
+        assert_that(self.sent, has_length(2))
+
+    @unittest.test
+    def shared_request_is_waited_within_deadline(self):
+        ''' caller sharing a request waits no longer than its own Deadline '''
+        pages = []
+        first = self.get_in_thread(pages)
+        while not self.sent: time.sleep(0.01)
+        started = time.time()
+        should_raise(springnote.SpringnoteError.Timeout, when=lambda: 
+            springnote.Deadline(0.1).call(springnote.Page(self.sn, id=4).get))
+        assert_that(time.time() - started < 1, is_(True))
+        self.release.set()
+        first.join()
+        assert_that(self.sent, has_length(1))
+
+class HedgeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.hedge = springnote.HedgePolicy(percentile=90, min_samples=10)
+        self.sn = springnote.Springnote(hedge=self.hedge)
+        self.sent, self.release, self.read = [], threading.Event(), []
+        def springnote_request(*args, **kwarg):
+            self.sent.append(kwarg)
+            if len(self.sent) == 1:
+                self.release.wait() # first request is late
+            response = Mock()
+            response.status = 200
+            def read():
+                self.read.append(response)
+                return sample_json
+            response.read = read
+            return stub_headers(response)
+        self.sn.springnote_request = springnote_request
+
+    @unittest.test
+    def delay_is_percentile_of_recent_latencies(self):
+        ''' no hedging until min_samples, and then the percentile is waited '''
+        assert_that(self.hedge.delay(), is_(None))
+        for i in range(1, 11): self.hedge.observe(i / 100.0)
+        assert_that(self.hedge.delay(), is_(0.10))
+
+    @unittest.test
+    def late_get_is_hedged_and_faster_response_wins(self):
+        ''' Page.get() sends again when the first is late, and the first response wins '''
+        for i in range(10): self.hedge.observe(0.01)
+        page = springnote.Page(self.sn, id=4).get()
+
+        assert_that(page.title, is_("TestPage"))
+        assert_that(self.sent,  has_length(2))
+        assert_that(self.hedge.stats['hedged'],    is_(1))
+        assert_that(self.hedge.stats['hedge_won'], is_(1))
+
+        # late response is read and thrown away
+        self.release.set()
+        while len(self.read) < 2: time.sleep(0.01)
+
+    @unittest.test
+    def requests_do_not_wait_for_each_other(self):
+        ''' concurrent Page.get() calls are all in flight at once, however many '''
+        for i in range(10): self.hedge.observe(10) # hedge never fires
+        self.release.set()
+        in_flight, most = [0], [0]
+        lock = threading.Lock()
+        def springnote_request(*args, **kwarg):
+            lock.acquire(); in_flight[0] += 1; most[0] = max(most[0], in_flight[0]); lock.release()
+            time.sleep(0.1)
+            lock.acquire(); in_flight[0] -= 1; lock.release()
+            response = Mock()
+            response.status = 200
+            response.read   = lambda: sample_json
+            return stub_headers(response)
+        self.sn.springnote_request = springnote_request
+
+        threads = [threading.Thread(target=springnote.Page(self.sn, id=4).get)
+                    for i in range(32)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        assert_that(most[0], is_(32))
+        assert_that(self.hedge.stats['hedged'], is_(0))
+
+    @unittest.test
+    def late_get_is_not_hedged_over_max_hedges(self):
+        ''' no second request is sent while max_hedges of them are in flight '''
+        self.hedge = springnote.HedgePolicy(percentile=90, min_samples=10, max_hedges=0)
+        self.sn.hedge = self.hedge
+        for i in range(10): self.hedge.observe(0.01)
+        threading.Timer(0.1, self.release.set).start()
+        page = springnote.Page(self.sn, id=4).get()
+
+        assert_that(page.title, is_("TestPage"))
+        assert_that(self.sent,  has_length(1))
+        assert_that(self.hedge.stats['not_hedged'], is_(1))
+
+    @unittest.test
+    def save_is_not_hedged(self):
+        ''' writes are never sent twice '''
+        for i in range(10): self.hedge.observe(0.01)
+        self.release.set()
+        springnote.Page(self.sn, id=4, title='title').save()
+        assert_that(self.sent, has_length(1))
+
+class RetryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.slept = []
+        self.retry = springnote.RetryPolicy(max_retries=2)
+        self.retry.sleep = self.slept.append
+        self.sn = springnote.Springnote(retry=self.retry)
+        self.sent, self.statuses = [], [503, 200]
+        def springnote_request(*args, **kwarg):
+            self.sent.append(kwarg)
+            response = Mock()
+            response.status = self.statuses.pop(0)
+            response.read   = lambda: response.status == 200 and sample_json or '{}'
+            return stub_headers(response, {'Retry-After': '2'})
+        self.sn.springnote_request = springnote_request
+
+    @unittest.test
+    def get_is_retried_after_server_error(self):
+        ''' 503 on GET is retried after Retry-After seconds, and counted '''
+        page = springnote.Page(self.sn, id=4).get()
+        assert_that(page.title, is_("TestPage"))
+        assert_that(self.sent,  has_length(2))
+        assert_that(self.slept, is_([2]))
+        assert_that(self.retry.stats['retries'], is_(1))
+
+    @unittest.test
+    def post_is_not_retried(self):
+        ''' 503 on POST is raised at once '''
+        should_raise(springnote.SpringnoteError.Response, 
+                    when=lambda: springnote.Page(self.sn, title='new').save())
+        assert_that(self.sent, has_length(1))
+
+    @unittest.test
+    def retry_is_not_made_over_budget(self):
+        ''' no retry is made when the retry budget is spent '''
+        self.retry.budget = springnote.RetryBudget(ratio=0, min_per_second=0)
+        should_raise(springnote.SpringnoteError.Response, 
+                    when=lambda: springnote.Page(self.sn, id=4).get())
+        assert_that(self.retry.stats['over_budget'], is_(1))
+
+    @unittest.test
+    def budget_is_turned_off_by_none(self):
+        ''' RetryPolicy(budget=None) has no budget, and a new one by default '''
+        assert_that(springnote.RetryPolicy(budget=None).budget, is_(None))
+        assert_that(springnote.RetryPolicy().budget, instance_of(springnote.RetryBudget))
+        assert_that(springnote.RetryPolicy().budget,
+                    is_not(springnote.RetryPolicy().budget))
+        retry = springnote.RetryPolicy(budget=None)
+        assert_that(retry.should_retry('GET', None, 0), is_(True))
+
+    @unittest.test
+    def backoff_grows_exponentially_with_jitter(self):
+        ''' delay is random between 0 and backoff * 2^attempt, up to max_backoff '''
+        retry = springnote.RetryPolicy(backoff=1, max_backoff=5)
+        for attempt, limit in [(0, 1), (1, 2), (2, 4), (5, 5)]:
+            delay = retry.delay(attempt)
+            assert_that(0 <= delay <= limit, is_(True))
+
+    @unittest.test
+    def retry_after_is_waited_up_to_max_backoff(self):
+        ''' Retry-After longer than max_backoff is cut to max_backoff '''
+        retry = springnote.RetryPolicy(max_backoff=30)
+        assert_that(retry.delay(0, '3600'), is_(30))
+        assert_that(retry.delay(0, '10'),   is_(10))
+        later = time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(time.time() + 3600))
+        assert_that(retry.delay(0, later),  is_(30))
+
 # don't know how to test!
 class ConventionalMethodsTestCase(unittest.TestCase):
     def setUp(self):
@@ -457,6 +809,166 @@ class ConventionalMethodsTestCase(unittest.TestCase):
             arg=with_at_least(parent_id=eq(page.id), verbose=eq(verbose)))
 
 
+class GetManyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.sn   = springnote.Springnote()
+        self.sent = []
+        def springnote_request(*args, **kwarg):
+            self.sent.append(kwarg['url'])
+            ids = re.search('identifiers=([0-9%C,]+)', kwarg['url']).group(1)
+            ids = urllib.unquote(ids).split(',')
+            response = Mock()
+            response.status = 200
+            stub_headers(response)
+            response.read = lambda: '[%s]' % ', '.join(
+                '{"page": {"identifier": %s, "title": "page %s"}}' % (id, id) 
+                    for id in ids if id != '404')
+            return response
+        self.sn.springnote_request = springnote_request
+
+    @unittest.test
+    def ids_are_requested_in_chunks(self):
+        ''' Page.get_many(ids) sends list(identifiers=) once per chunk '''
+        springnote.Page.get_many(self.sn, range(1, 121), chunk_size=50)
+        assert_that(self.sent, has_length(3))
+
+    @unittest.test
+    def chunks_are_short_enough_for_url(self):
+        ''' chunk of ids joined by comma is not longer than max_length '''
+        chunks = springnote.Page._chunk_identifiers(range(100000, 100100), max_length=70)
+        for chunk in chunks:
+            assert_that(len(",".join(map(str, chunk))) <= 70, is_(True))
+        assert_that(sum(map(len, chunks)), is_(100))
+
+    @unittest.test
+    def pages_are_returned_in_order_of_ids(self):
+        ''' pages are in order of ids given, and None for missing page '''
+        pages = springnote.Page.get_many(self.sn, [3, 404, 1, 2], chunk_size=2)
+        assert_that(pages[0].id, is_(3))
+        assert_that(pages[1],    is_(None))
+        assert_that(pages[2].id, is_(1))
+        assert_that(pages[3].id, is_(2))
+
+class IterListTestCase(unittest.TestCase):
+    def setUp(self):
+        self.sn    = springnote.Springnote()
+        self.reads = []
+        self.responses = []
+        self.body  = '[{"page": {"identifier": 3, "relation_is_part_of": 1, "title": "child"}}, ' \
+                     ' {"page": {"identifier": 1, "relation_is_part_of": null, "title": "root"}},' \
+                     ' {"page": {"identifier": 2, "relation_is_part_of": 1, "title": "\\uc2a4"}} ]'
+        def springnote_request(*args, **kwarg):
+            content  = StringIO.StringIO(self.body)
+            response = Mock()
+            response.status = 200
+            def read(size=-1):
+                self.reads.append(content.tell())
+                return content.read(size)
+            response.read = read
+            response.closed = False
+            def close(): response.closed = True
+            response.close = close
+            self.responses.append(response)
+            return stub_headers(response)
+        self.sn.springnote_request = springnote_request
+
+    @unittest.test
+    def pages_are_yielded_as_they_are_read(self):
+        ''' Page.iter_list() yields each page once it is read, not the whole body first '''
+        pages = springnote.Page.iter_list(self.sn, chunk_size=16)
+        first = pages.next()
+        assert_that(first.id,    is_(3))
+        assert_that(first.title, is_(u"child"))
+        assert_that(self.reads[-1] < len(self.body) / 2, is_(True))
+        assert_that([page.id for page in pages], is_([1, 2]))
+
+    @unittest.test
+    def pages_are_the_same_as_list(self):
+        ''' Page.iter_list() yields what Page.list() returns, parents connected '''
+        listed = springnote.Page.list(self.sn)
+        for chunk_size in [1, 7, 64*1024]:
+            pages = list(springnote.Page.iter_list(self.sn, chunk_size=chunk_size))
+            assert_that([page.resource for page in pages],
+                        is_([page.resource for page in listed]))
+            assert_that(pages[0].parent, is_(pages[1]))
+            assert_that(pages[1].parent, is_(None))
+            assert_that(pages[2].parent, is_(pages[1]))
+            assert_that(pages[2].title,  is_(u'\uc2a4'))
+
+    @unittest.test
+    def parents_are_not_kept_unless_linked(self):
+        ''' Page.iter_list(link_parents=False) leaves parent None '''
+        pages = list(springnote.Page.iter_list(self.sn, link_parents=False))
+        assert_that([page.parent for page in pages], is_([None, None, None]))
+
+    @unittest.test
+    def response_is_closed_when_stopped(self):
+        ''' rest of the list is not read when iteration stops early; the response is closed '''
+        pages = springnote.Page.iter_list(self.sn, chunk_size=16)
+        pages.next()
+        pages.close()
+        assert_that(self.reads[-1] < len(self.body) / 2, is_(True))
+        assert_that(self.responses[-1].closed, is_(True))
+
+    @unittest.test
+    def response_is_read_to_the_end_when_finished(self):
+        ''' response read through is left open, for the connection to be reused '''
+        list(springnote.Page.iter_list(self.sn, chunk_size=16))
+        assert_that(self.reads[-1], is_(len(self.body)))
+        assert_that(self.responses[-1].closed, is_(False))
+
+    @unittest.test
+    def connection_of_response_stopped_is_dropped(self):
+        ''' connection of the response left unread is closed and taken out of the pool '''
+        conn, closed = Mock(), []
+        conn.close = lambda: closed.append(conn)
+        request = self.sn.springnote_request
+        def springnote_request(*args, **kwarg):
+            response = request(*args, **kwarg)
+            self.sn.pool.release(springnote.HOST, False, conn, response)
+            return response
+        self.sn.springnote_request = springnote_request
+        pages = springnote.Page.iter_list(self.sn, chunk_size=16)
+        pages.next()
+        pages.close()
+        assert_that(closed, is_([conn]))
+        assert_that(self.sn.pool.connections[(springnote.HOST, False)], is_([]))
+
+    @unittest.test
+    def deadline_applies_while_streaming(self):
+        ''' Page.iter_list() raises Timeout once the Deadline passes while the list is read '''
+        deadline = springnote.Deadline(10)
+        pages = springnote.Page.iter_list(self.sn, chunk_size=16)
+        deadline.__enter__()
+        try:
+            pages.next()
+            deadline.expires = time.time() - 1
+            should_raise(springnote.SpringnoteError.Timeout, when=lambda: list(pages))
+        finally:
+            deadline.__exit__()
+        assert_that(self.responses[-1].closed, is_(True))
+
+    @unittest.test
+    def broken_list_raises_parse_error(self):
+        ''' Page.iter_list() raises ParseError on json which is not a whole list '''
+        for body in ['{"page": {"identifier": 3}}', '[{"page": {"identifier": 3}}',
+                     '[{"page": {"identifier": 3}} {"page": {"identifier": 4}}]', '[1, 2]']:
+            self.body = body
+            should_raise(springnote.SpringnoteError.ParseError,
+                when=lambda: list(springnote.Page.iter_list(self.sn, chunk_size=4)))
+
+    @unittest.test
+    def empty_list_yields_nothing(self):
+        ''' Page.iter_list() yields nothing for [] '''
+        self.body = ' [ ] '
+        assert_that(list(springnote.Page.iter_list(self.sn)), is_([]))
+
+    @unittest.test
+    def client_has_iter_list_pages(self):
+        ''' sn.iter_list_pages() is Page.iter_list(sn), also for AsyncSpringnote '''
+        assert_that([page.id for page in self.sn.iter_list_pages()], is_([3, 1, 2]))
+        assert_that(hasattr(springnote.AsyncSpringnote, 'iter_list_pages'), is_(True))
+
 class JsonTestCase(unittest.TestCase):
     def convert_string_to_unicode(self, data):
         if isinstance(data, types.StringType):
@@ -478,7 +990,7 @@ class JsonTestCase(unittest.TestCase):
         self.o_json       = springnote.json
 
         # mock objects
-        springnote.Springnote = CMock()
+        springnote.Springnote = SpringnoteCMock()
         springnote.json       = Mock()
         self.m_get_response   = Mock()
 
@@ -542,7 +1054,7 @@ class BuildModelFromResponseTestCase(unittest.TestCase):
         springnote.json   = self.mock_module_json()
 
         # mock objects
-        springnote.Springnote = CMock()
+        springnote.Springnote = SpringnoteCMock()
         self.m_get_response   = Mock()
 
         # default Springnote.springnote_request behavior
@@ -644,6 +1156,33 @@ class BuildModelFromResponseTestCase(unittest.TestCase):
         assert_that(pages[0], (instance_of(springnote.Page)))
         assert_that(pages[0].raw, is_not(has_length(0)))
 
+    @unittest.test
+    def json_list_is_decoded_once(self):
+        ''' pages of a list are built from the structure loaded, without encoding them again '''
+        json  = self.restore_module_json()
+        calls = []
+        class CountingJson:
+            def loads(self, data, **kwarg): calls.append('loads'); return json.loads(data, **kwarg)
+            def dumps(self, *args, **kwarg): calls.append('dumps'); return json.dumps(*args, **kwarg)
+        springnote.json = CountingJson()
+        try:
+            pages = springnote.Page.from_json(list_sample_json, self.auth)
+            assert_that(calls, is_(['loads']))
+            assert_that(pages[1].title, is_("TestPage"))
+            assert_that(json.loads(pages[1].raw), is_(sample_data))
+        finally:
+            springnote.json = json
+
+    @unittest.test
+    def raw_of_listed_page_is_response_data(self):
+        ''' raw of a page in a list keeps fields beyond its attributes, and not changes made after '''
+        json = self.restore_module_json()
+        data = '[{"page": {"identifier": 3, "title": "t", "uri": "http://note.springnote.com/pages/3"}}]'
+        page = springnote.Page.from_json(data, self.auth)[0]
+        page.title = u'changed'
+        assert_that(json.loads(page.raw), is_({'page': {'identifier': 3, 
+            'title': 't', 'uri': 'http://note.springnote.com/pages/3'}}))
+
     @unittest.test
     def other_page_methods_call_request_method(self):
         ''' get, save, delete calls method request '''
@@ -730,7 +1269,7 @@ class TagConversionTestCase(unittest.TestCase):
         self.o_json       = springnote.json
 
         # mock objects
-        springnote.Springnote = CMock()
+        springnote.Springnote = SpringnoteCMock()
         springnote.json       = Mock()
         self.m_get_response   = Mock()
 
@@ -808,7 +1347,7 @@ class DateTimeConvesionTestCase(unittest.TestCase):
         self.o_json       = springnote.json
 
         # mock objects
-        springnote.Springnote = CMock()
+        springnote.Springnote = SpringnoteCMock()
         springnote.json       = Mock()
         self.m_get_response   = Mock()
 
@@ -21,7 +21,7 @@ class HttplibRequestMockedTestCase(unittest.TestCase):
 
         # mocks
         self.response      = Mock()
-        self.conn          = Mock()
+        self.conn          = MockConnection()
         springnote.httplib = Mock()
         # httplib mock
         self.httplib = springnote.httplib
@@ -39,6 +39,7 @@ class HttplibRequestMockedTestCase(unittest.TestCase):
         # response mock
         self.response.read = lambda: '{}'
         self.response.status = 200
+        stub_headers(self.response)
 
         self.sn = springnote.Springnote()
 
@@ -57,6 +58,7 @@ class NoNetworkExceptionTestCase(HttplibRequestMockedTestCase):
         import socket
         self.conn.expects(once()).method("request") \
             .will(raise_exception(socket.gaierror("no network")))
+        self.conn.expects(once()).method("close") # not left open
 
         # run
         run = lambda: self.sn.springnote_request("GET", "some.url/with/path")
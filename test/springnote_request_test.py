@@ -10,7 +10,7 @@ Test Springnote.springnote_request, by mocking out the actual connection
 import test_env
 from test_env import *
 
-import unittest, types
+import unittest, types, tempfile, os, re, socket, time, StringIO
 from pmock import *
 from pmock_xtnd import *
 
@@ -32,7 +32,7 @@ def restore_module_httplib():
 class HttpParamsTestCase(unittest.TestCase):
     def setUp(self):
         mock_module_httplib()
-        self.conn     = Mock() # mock connection
+        self.conn     = MockConnection() # mock connection
         self.file_obj = Mock() # mock file object
         self.file_obj.name = "testfile.txt"
         self.file_obj.read = lambda: "FILE CONTENT"
@@ -86,7 +86,7 @@ class HttpParamsTestCase(unittest.TestCase):
             conn.request(...)
             conn.getresult()
         """
-        conn = Mock()
+        conn = MockConnection()
         springnote.httplib \
             .expects(once()).method("HTTPSConnection") \
             .will(return_value(conn))
@@ -113,10 +113,10 @@ class HttpParamsTestCase(unittest.TestCase):
         self.sn.springnote_request("GET", "http://url.com/data.json")
 
     @unittest.test
-    def file_object_body_should_be_converted_to_multipart_str(self):
+    def file_object_body_should_be_converted_to_multipart_body(self):
         """
             when a file object is given as a body,
-            it needs to convert to multipart string. 
+            it needs to convert to multipart body, read as a string. 
 
             an example is shown below:
 
@@ -127,14 +127,27 @@ class HttpParamsTestCase(unittest.TestCase):
                 '*** This is where the content of file is. ***\r\n' \
                 '--AaB03x--\r\n'
         """
+        class ReadsContaining(types.ObjectType):
+            def __init__(self, *fragments): self.fragments = fragments
+            def __repr__(self): return "%s.reads_containing%r" % (__name__, self.fragments)
+            def eval(self, arg):
+                content = arg.read()
+                arg.seek(0)
+                for fragment in self.fragments:
+                    if fragment not in content:
+                        return False
+                return True
+        reads_containing = ReadsContaining
+
         # mock
         self.httplib.expects(once()).method("HTTPConnection").will(return_value(self.conn))
         self.conn.expects(once()).getresponse()
         self.conn.expects(once()).method("request") \
-            .with_at_least(body=string_contains('Content-Disposition: form-data;')) \
-            .with_at_least(body=string_contains('name="Filedata"')) \
-            .with_at_least(body=string_contains('filename="%s"' % self.file_obj.name)) \
-            .with_at_least(body=string_contains(self.file_obj.read()))
+            .with_at_least(body=reads_containing(
+                'Content-Disposition: form-data;', 
+                'name="Filedata"', 
+                'filename="%s"' % self.file_obj.name, 
+                self.file_obj.read()))
 
         #
         self.sn.springnote_request("POST", "http://url.com/data", body=self.file_obj)
@@ -166,6 +179,343 @@ class HttpParamsTestCase(unittest.TestCase):
         #
         self.sn.springnote_request("PUT", "http://url.com/edit.json", body=self.file_obj)
 
+class MultipartBodyTestCase(unittest.TestCase):
+    @unittest.test
+    def file_on_disk_is_streamed_with_its_size(self):
+        ''' file on disk is not read at once, but length is known by its size '''
+        file_obj = tempfile.NamedTemporaryFile()
+        file_obj.write('x' * 10000)
+        file_obj.seek(0)
+        body = springnote.Springnote.wrap_file_to_body(file_obj)
+
+        chunks = []
+        while True:
+            chunk = body.read(4096)
+            if not chunk: break
+            chunks.append(chunk)
+        assert_that(max(map(len, chunks)) <= 4096, is_(True))
+        assert_that(len(''.join(chunks)), is_(len(body)))
+        assert_that(''.join(chunks), string_contains('x' * 10000))
+
+class ConnectionPoolTestCase(unittest.TestCase):
+    def setUp(self):
+        self.httplib  = mock_module_httplib()
+        self.conn     = MockConnection()
+        self.response = Mock()
+        self.response.isclosed = lambda: True # response is read to the end
+        self.sn = springnote.Springnote()
+
+    def tearDown(self):
+        restore_module_httplib()
+
+    @unittest.test
+    def connection_should_be_reused_after_response_is_read(self):
+        ''' second request uses the same connection, without creating new one '''
+        self.httplib.expects(once()).method("HTTPConnection") \
+            .will(return_value(self.conn))
+        self.conn.expects(at_least_once()).method("request")
+        self.conn.expects(at_least_once()).getresponse() \
+            .will(return_value(self.response))
+
+        self.sn.springnote_request("GET", "http://url.com/data.json")
+        self.sn.springnote_request("GET", "http://url.com/data.json")
+
+    @unittest.test
+    def connection_should_not_be_reused_while_response_is_unread(self):
+        ''' new connection is made if previous response is not read yet '''
+        self.response.isclosed = lambda: False
+        self.httplib.expects(once()).method("HTTPConnection") \
+            .will(return_value(self.conn))
+        self.conn.expects(once()).method("request")
+        self.conn.expects(once()).getresponse() \
+            .will(return_value(self.response))
+        self.sn.springnote_request("GET", "http://url.com/data.json")
+
+        conn2 = MockConnection()
+        self.httplib.expects(once()).method("HTTPConnection") \
+            .will(return_value(conn2))
+        conn2.expects(once()).method("request")
+        conn2.expects(once()).getresponse()
+        self.sn.springnote_request("GET", "http://url.com/data.json")
+
+    @unittest.test
+    def stale_connection_should_reconnect(self):
+        ''' reused connection closed by server is replaced with a new one '''
+        import socket
+        self.sn.pool.release(springnote.HOST, False, self.conn)
+        self.conn.expects(once()).method("request") \
+            .will(raise_exception(socket.error("connection reset by peer")))
+        self.conn.expects(once()).method("close")
+        conn2 = MockConnection()
+        self.httplib.expects(once()).method("HTTPConnection") \
+            .will(return_value(conn2))
+        conn2.expects(once()).method("request")
+        conn2.expects(once()).getresponse()
+
+        self.sn.springnote_request("GET", "http://url.com/data.json")
+
+    @unittest.test
+    def idle_connection_should_be_closed(self):
+        ''' connections idle longer than max_idle are closed on next acquire '''
+        pool = springnote.ConnectionPool(max_idle=0)
+        pool.release(springnote.HOST, False, self.conn)
+        self.conn.expects(once()).method("close")
+        self.httplib.expects(once()).method("HTTPConnection") \
+            .will(return_value(Mock()))
+
+        conn, reused = pool.acquire(springnote.HOST, False)
+        assert_that(reused, is_(False))
+
+    @unittest.test
+    def connection_with_response_left_unread_is_dropped_but_not_closed(self):
+        ''' connection whose response is pending longer than max_idle is dropped, 
+        and left open for the body to be read to the end '''
+        pool = springnote.ConnectionPool(max_idle=0)
+        self.response.isclosed = lambda: False
+        pool.release(springnote.HOST, False, self.conn, self.response)
+        closed = []
+        self.conn.close = lambda: closed.append(self.conn)
+        self.httplib.expects(once()).method("HTTPConnection") \
+            .will(return_value(MockConnection()))
+
+        conn, reused = pool.acquire(springnote.HOST, False)
+        assert_that(reused, is_(False))
+        assert_that(closed, is_([]))
+        assert_that(pool.connections[(springnote.HOST, False)], is_([]))
+
+    @unittest.test
+    def new_connection_is_closed_when_request_fails(self):
+        ''' connection made for a request is closed if the request fails '''
+        import socket
+        self.httplib.expects(once()).method("HTTPConnection") \
+            .will(return_value(self.conn))
+        self.conn.expects(once()).method("request") \
+            .will(raise_exception(socket.error("connection refused")))
+        closed = []
+        self.conn.close = lambda: closed.append(self.conn)
+        should_raise(socket.error, 
+            when=lambda: self.sn.springnote_request("GET", "http://url.com/data.json"))
+        assert_that(closed, is_([self.conn]))
+        assert_that(self.sn.pool.connections.get((springnote.HOST, False), []), is_([]))
+
+class RateLimiterTestCase(unittest.TestCase):
+    @unittest.test
+    def bucket_allows_burst_and_then_waits(self):
+        ''' TokenBucket gives burst tokens at once, and tells how long to wait after '''
+        bucket = springnote.TokenBucket(rate=10, burst=2)
+        assert_that(bucket._take(1), is_(0))
+        assert_that(bucket._take(1), is_(0))
+        assert_that(0 < bucket._take(1) <= 0.1, is_(True))
+
+    @unittest.test
+    def file_bucket_is_shared_by_path(self):
+        ''' FileTokenBucket of the same path share tokens '''
+        path = tempfile.mktemp()
+        try:
+            bucket1 = springnote.FileTokenBucket(path, rate=0.01, burst=2)
+            bucket2 = springnote.FileTokenBucket(path, rate=0.01, burst=2)
+            assert_that(bucket1._take_from_file(1), is_(0))
+            assert_that(bucket2._take_from_file(1), is_(0))
+            assert_that(bucket1._take_from_file(1) > 0, is_(True))
+        finally:
+            os.remove(path)
+
+    @unittest.test
+    def springnote_request_waits_for_rate_limiter_with_note(self):
+        ''' springnote_request() acquires rate limiter for the note requested '''
+        notes = []
+        limiter = Mock()
+        limiter.acquire = lambda note=None: notes.append(note)
+        httplib = mock_module_httplib()
+        try:
+            conn = MockConnection()
+            httplib.expects(once()).method("HTTPConnection").will(return_value(conn))
+            conn.expects(once()).method("request")
+            conn.expects(once()).getresponse()
+
+            sn = springnote.Springnote(rate_limiter=limiter)
+            sn.springnote_request("GET", "http://url.com/pages.json", 
+                                    params={'domain': 'jangxyz'})
+        finally:
+            restore_module_httplib()
+        assert_that(notes, is_(['jangxyz']))
+
+class ConcurrencyControllerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.controller = springnote.ConcurrencyController(initial=4, max_limit=8)
+
+    def finish(self, latency, ok=True):
+        self.controller.acquire()
+        self.controller.release(latency, ok)
+
+    @unittest.test
+    def limit_increases_while_latency_is_flat(self):
+        ''' limit grows additively while responses are good '''
+        for i in range(8):
+            self.finish(0.1)
+        assert_that(5 <= self.controller.limit < 6, is_(True))
+
+    @unittest.test
+    def limit_decreases_on_error(self):
+        ''' limit is halved on failed request '''
+        self.finish(0.1, ok=False)
+        assert_that(self.controller.limit, is_(2.0))
+
+    @unittest.test
+    def limit_decreases_on_latency_spike(self):
+        ''' limit is halved if latency grows over latency_factor times usual '''
+        self.finish(0.1)
+        limit = self.controller.limit
+        self.finish(1.0)
+        assert_that(self.controller.limit, is_(limit / 2))
+
+    @unittest.test
+    def map_uses_as_many_workers_as_controller_allows(self):
+        ''' sn.map() runs in max_limit threads of client's controller by default '''
+        sn = springnote.Springnote(concurrency=self.controller)
+        assert_that(springnote.workers_for(sn), is_(8))
+        assert_that(springnote.workers_for(springnote.Springnote()), is_(4))
+
+class DeadlineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.sn = springnote.Springnote(connect_timeout=10, read_timeout=30)
+
+    @unittest.test
+    def timeouts_are_shortened_to_deadline(self):
+        ''' connect and read timeouts are no longer than the time left '''
+        assert_that(self.sn.timeouts(), is_((10, 30)))
+        connect_timeout, read_timeout = springnote.Deadline(1).call(self.sn.timeouts)
+        assert_that(connect_timeout <= 1 and read_timeout <= 1, is_(True))
+
+    @unittest.test
+    def request_fails_fast_after_deadline(self):
+        ''' Timeout is raised without connecting once deadline has passed '''
+        httplib = mock_module_httplib() # any connection fails the test
+        try:
+            run = lambda: springnote.Deadline(-1).call(
+                self.sn.springnote_request, "GET", "http://url.com/data.json")
+            should_raise(springnote.SpringnoteError.Timeout, when=run)
+        finally:
+            restore_module_httplib()
+
+    @unittest.test
+    def reused_socket_does_not_keep_timeout_of_last_client(self):
+        ''' set_timeouts without timeouts sets no limit on a reused socket '''
+        timeouts = []
+        conn = MockConnection()
+        conn.sock = Mock()
+        conn.sock.settimeout = timeouts.append
+        springnote.ConnectionPool.set_timeouts(conn, 1, 2)
+        springnote.ConnectionPool.set_timeouts(conn)
+        assert_that(timeouts, is_([2, None]))
+
+    def slow_response(self, times_out=False):
+        ''' response whose socket records timeouts, read a byte at a time '''
+        response = Mock()
+        response.timeouts = []
+        response.fp = Mock()
+        response.fp._sock = Mock()
+        response.fp._sock.settimeout = response.timeouts.append
+        body = StringIO.StringIO('[]')
+        def read(size=-1):
+            if times_out: raise socket.timeout('timed out')
+            time.sleep(0.01)
+            return body.read(min(size, 1))
+        response.read = read
+        return response
+
+    @unittest.test
+    def body_read_timeout_is_springnote_timeout(self):
+        ''' socket.timeout while reading body is raised as SpringnoteError.Timeout '''
+        response = self.slow_response(times_out=True)
+        should_raise(springnote.SpringnoteError.Timeout,
+            when=lambda: springnote.read_body(response))
+        should_raise(springnote.SpringnoteError.Timeout,
+            when=lambda: springnote.Deadline(5).call(springnote.read_body, response))
+
+    @unittest.test
+    def body_is_read_within_deadline(self):
+        ''' each read of the body waits no longer than what is left of the deadline '''
+        response = self.slow_response()
+        body = springnote.Deadline(5).call(springnote.read_body, response, 30)
+        assert_that(body, is_('[]'))
+        assert_that(len(response.timeouts) >= 2, is_(True))
+        assert_that(response.timeouts[0] <= 5, is_(True))
+        assert_that(response.timeouts[-1] < response.timeouts[0], is_(True))
+
+        response = self.slow_response()
+        should_raise(springnote.SpringnoteError.Timeout,
+            when=lambda: springnote.Deadline(0.015).call(springnote.read_body, response))
+
+    @unittest.test
+    def deadline_is_carried_to_executor(self):
+        ''' request submitted to an executor runs within the submitter's deadline '''
+        executor = springnote.RequestExecutor(1)
+        deadline = springnote.Deadline(5)
+        future   = deadline.call(executor.submit, springnote.Deadline.current)
+        assert_that(future.result(), is_(deadline))
+        executor.shutdown()
+
+class CircuitBreakerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.breaker = springnote.CircuitBreaker(min_requests=4, window=4,
+                                                 reset_timeout=60)
+
+    def fail(self, times):
+        for i in range(times):
+            self.breaker.allow()
+            self.breaker.record(False)
+
+    @unittest.test
+    def opens_when_failure_ratio_is_reached(self):
+        ''' breaker opens after half of the recent requests failed '''
+        self.breaker.record(True)
+        self.fail(1)
+        self.breaker.record(True)
+        assert_that(self.breaker.state, is_('closed'))
+        self.fail(1)
+        assert_that(self.breaker.state, is_('open'))
+        should_raise(springnote.SpringnoteError.CircuitOpen, when=self.breaker.allow)
+        assert_that(self.breaker.stats['rejected'], is_(1))
+
+    @unittest.test
+    def slow_responses_count_as_failures(self):
+        ''' responses slower than slow_latency fail like errors '''
+        self.breaker.slow_latency = 1
+        for i in range(4):
+            self.breaker.record(True, latency=2)
+        assert_that(self.breaker.state, is_('open'))
+
+    @unittest.test
+    def half_open_trial_closes_or_opens_again(self):
+        ''' after reset_timeout one trial is let through, which decides the state '''
+        self.fail(4)
+        self.breaker.opened -= 60
+        self.breaker.allow()
+        assert_that(self.breaker.state, is_('half_open'))
+        should_raise(springnote.SpringnoteError.CircuitOpen, when=self.breaker.allow)
+        self.breaker.record(False)
+        assert_that(self.breaker.state, is_('open'))
+
+        self.breaker.opened -= 60
+        self.breaker.allow()
+        self.breaker.record(True)
+        assert_that(self.breaker.state, is_('closed'))
+
+    @unittest.test
+    def open_breaker_fails_before_signing_and_connecting(self):
+        ''' springnote_request() raises CircuitOpen without building oauth request '''
+        self.fail(4)
+        sn, signed = springnote.Springnote(circuit_breaker=self.breaker), []
+        sn.oauth_request = lambda *args, **kwarg: signed.append(args)
+        httplib = mock_module_httplib() # any connection fails the test
+        try:
+            should_raise(springnote.SpringnoteError.CircuitOpen,
+                when=lambda: sn.springnote_request("GET", "http://url.com/data.json"))
+        finally:
+            restore_module_httplib()
+        assert_that(signed, is_([]))
+
 class OauthRequestTestCase(unittest.TestCase):
     def setUp(self):
         self.sn = springnote.Springnote()
@@ -228,7 +578,7 @@ class OauthRequestTestCase(unittest.TestCase):
 
         # mock
         mock_module_httplib() # springnote.httplib
-        conn = Mock()
+        conn = MockConnection()
         springnote.httplib.expects(once()).method("HTTPConnection") \
             .will(return_value(conn))
         conn.expects(once()).getresponse()
@@ -241,6 +591,285 @@ class OauthRequestTestCase(unittest.TestCase):
         # restore 
         restore_module_httplib()
 
+    @unittest.test
+    def normalized_parameters_are_sorted_by_escaped_key_and_value(self):
+        ''' static oauth parameters are merged in order with the rest '''
+        oauth = springnote.oauth
+        req = oauth.OAuthRequest("GET", "http://url.com/data.json", {
+            'oauth_consumer_key': 'ck', 'oauth_version': '1.0', 'a': 'b c',
+            'oauth_nonce': '12', 'z': '1', 'oauth_token': 'tk'})
+        assert_that(req.get_normalized_parameters(), is_('a=b%20c&'
+            'oauth_consumer_key=ck&oauth_nonce=12&oauth_token=tk&oauth_version=1.0&z=1'))
+
+    @unittest.test
+    def signature_is_hmac_sha1_of_base_string_with_cached_key(self):
+        ''' signing with the pre-keyed hmac gives the same signature every time '''
+        import hmac, hashlib, base64
+        oauth    = springnote.oauth
+        method   = oauth.OAuthSignatureMethod_HMAC_SHA1()
+        consumer = oauth.OAuthConsumer('ck', 'c/s')
+        token    = oauth.OAuthToken('tk', 't&s')
+        req = oauth.OAuthRequest.from_consumer_and_token(consumer, token,
+                "GET", "http://url.com/data.json", {'q': 'x'})
+        key, raw = method.build_signature_base_string(req, consumer, token)
+        expected = base64.b64encode(hmac.new(key, raw, hashlib.sha1).digest())
+
+        assert_that(key, is_('c%2Fs&t%26s'))
+        assert_that(method.build_signature(req, consumer, token), is_(expected))
+        assert_that(method.build_signature(req, consumer, token), is_(expected))
+
+    @unittest.test
+    def nonce_is_random_hex_and_unique(self):
+        ''' nonces are hex digits of the given length, and never repeat '''
+        oauth  = springnote.oauth
+        nonces = [oauth.generate_nonce() for i in range(10000)]
+        assert_that(len(set(nonces)), is_(10000))
+        assert_that(re.match('^[0-9a-f]{16}$', nonces[0]), is_not(None))
+        assert_that(len(oauth.generate_nonce(7)), is_(7))
+
+    @unittest.test
+    def nonce_buffer_is_not_shared_with_forked_process(self):
+        ''' buffer is read again when the process id has changed '''
+        oauth = springnote.oauth
+        oauth.generate_nonce()
+        buffer = oauth._nonce_buffer['bytes']
+        oauth._nonce_buffer['pid'] = -1
+        oauth.generate_nonce()
+        assert_that(oauth._nonce_buffer['bytes'] == buffer, is_(False))
+
+    @unittest.test
+    def timestamp_is_given_as_string(self):
+        ''' oauth_timestamp is the current second as a string '''
+        oauth_req = self.sn.oauth_request("GET", "http://url.com/data.json")
+        timestamp = oauth_req.parameters['oauth_timestamp']
+        assert_that(abs(int(timestamp) - springnote.time.time()) < 2, is_(True))
+        assert_that(timestamp, is_(springnote.oauth.generate_timestamp_string()))
+
+    @unittest.test
+    def normalizing_parameters_does_not_remove_signature(self):
+        ''' signature is left in parameters, and kept out of the base string '''
+        oauth_req = self.sn.oauth_request("GET", "http://url.com/data.json")
+        normalized = oauth_req.get_normalized_parameters()
+        assert_that(oauth_req.parameters, has_key('oauth_signature'))
+        assert_that(normalized, is_not(string_contains('oauth_signature=')))
+        assert_that(oauth_req.to_postdata(), string_contains('oauth_signature='))
+
+    @unittest.test
+    def unicode_value_is_escaped_in_utf8_once(self):
+        ''' unicode values are escaped as utf-8, and reused until changed '''
+        oauth = springnote.oauth
+        req = oauth.OAuthRequest("GET", "http://url.com/data.json", {'q': u'\uac00'})
+        assert_that(req.to_url(), is_('http://url.com/data.json?q=%EA%B0%80'))
+        assert_that(req.to_header()['Authorization'],
+                    is_('OAuth realm="", q="%EA%B0%80"'))
+        req.set_parameter('q', 'a b')
+        assert_that(req.to_postdata(), is_('q=a%20b'))
+
+class JsonBackendTestCase(unittest.TestCase):
+    @unittest.test
+    def backend_info_tells_c_or_python_for_each_part(self):
+        ''' json_backend_info() reports the json module and where each part is implemented '''
+        info = springnote.json_backend_info()
+        assert_that(info['codec'], is_(springnote.json.name))
+        assert_that(info['module'], is_(springnote.json.module.__name__))
+        for part in ['scanner', 'scanstring', 'encoder', 'encode_basestring_ascii']:
+            assert_that(info[part], is_in(['c', 'python']))
+
+    @unittest.test
+    def bundled_speedups_are_used_once_built(self):
+        ''' scanner of bundled simplejson is in C if its speedups are built '''
+        info = springnote.json_backend_info()
+        if info['path'] != springnote.BUNDLED_SIMPLEJSON:
+            return
+        if springnote.has_json_speedups():
+            assert_that(info['scanner'], is_('c'))
+        else:
+            assert_that(info['scanner'], is_('python'))
+
+class JsonCodecTestCase(unittest.TestCase):
+    def setUp(self):
+        self.o_json   = springnote.json
+        self.o_codecs = springnote.json_codecs[:]
+        self.calls    = []
+        def loads(data, object_hook=None):
+            self.calls.append('loads')
+            return self.o_json.loads(data)
+        def dumps(obj, ensure_ascii=True):
+            self.calls.append('dumps')
+            return self.o_json.dumps(obj, ensure_ascii=ensure_ascii)
+        self.codec = springnote.register_json_codec('counting', loads, dumps)
+
+    def tearDown(self):
+        springnote.json = self.o_json
+        springnote.json_codecs[:] = self.o_codecs
+
+    @unittest.test
+    def codec_is_chosen_by_name(self):
+        ''' use_json_codec('counting') makes springnote.json the registered codec '''
+        assert_that(springnote.use_json_codec('counting'), is_(self.codec))
+        assert_that(springnote.json, is_(self.codec))
+        assert_that(springnote.json_backend_info()['codec'], is_('counting'))
+        assert_that(springnote.json_backend_info()['scanner'], is_('unknown'))
+
+    @unittest.test
+    def resources_are_decoded_and_encoded_with_chosen_codec(self):
+        ''' from_json and to_json go through the codec in use, even if it ignores object_hook '''
+        springnote.use_json_codec('counting')
+        page = springnote.Page.from_json('{"page": {"identifier": 3, "title": "t"}}', Mock())
+        assert_that(page.id, is_(3))
+        pages = springnote.Page.from_json('[{"page": {"identifier": 4}}]', Mock())
+        assert_that(pages[0].id, is_(4))
+        page.to_json()
+        assert_that(self.calls, is_(['loads', 'loads', 'dumps']))
+
+    @unittest.test
+    def unknown_codec_is_invalid_option(self):
+        ''' use_json_codec raises InvalidOption for a name not registered '''
+        should_raise(springnote.SpringnoteError.InvalidOption, 
+            when=lambda: springnote.use_json_codec('no such codec'))
+        assert_that(springnote.json, is_(self.o_json))
+
+    @unittest.test
+    def first_registered_codec_is_default(self):
+        ''' use_json_codec() uses the codec registered first, without measuring '''
+        o_measure = springnote.measure_json_codec
+        springnote.measure_json_codec = lambda *args, **kwarg: self.fail('measured')
+        try:
+            codec = springnote.use_json_codec()
+        finally:
+            springnote.measure_json_codec = o_measure
+        assert_that(codec, is_(springnote.json_codecs[0]))
+
+    @unittest.test
+    def codecs_in_c_are_registered_first(self):
+        ''' codec scanning in C comes before those in python, so that it is the default '''
+        in_c = [codec.info()['scanner'] == 'c' for codec in self.o_codecs]
+        assert_that(in_c, is_(sorted(in_c, reverse=True)))
+
+    @unittest.test
+    def fastest_codec_is_chosen_automatically(self):
+        ''' use_json_codec('auto') measures registered codecs, skipping the failing ones '''
+        def fails(*args, **kwarg): raise ValueError
+        springnote.register_json_codec('failing', fails, fails)
+        codec = springnote.use_json_codec('auto')
+        assert_that(codec, is_in(springnote.json_codecs))
+        assert_that(codec.name, is_not('failing'))
+
+    @unittest.test
+    def codec_registered_later_must_be_clearly_faster(self):
+        ''' fastest_json_codec keeps the earlier codec unless a later one is faster by the margin '''
+        first = springnote.json_codecs[0]
+        elapsed = {first: 1.0, self.codec: 0.9}
+        o_measure = springnote.measure_json_codec
+        springnote.measure_json_codec = lambda codec: elapsed.get(codec)
+        try:
+            assert_that(springnote.fastest_json_codec(margin=0.2), is_(first))
+            elapsed[self.codec] = 0.5
+            assert_that(springnote.fastest_json_codec(margin=0.2), is_(self.codec))
+        finally:
+            springnote.measure_json_codec = o_measure
+
+    @unittest.test
+    def decoded_strings_are_unicode_with_any_codec(self):
+        ''' attributes are unicode whether the codec decodes ascii strings to str or not '''
+        data = '{"page": {"identifier": 3, "title": "title", "tags": "a b"}}'
+        for codec in self.o_codecs:
+            springnote.use_json_codec(codec.name)
+            page = springnote.Page.from_json(data, Mock())
+            assert_that(page.title, instance_of(unicode))
+            assert_that(page.title, is_(u'title'))
+            assert_that(page.tags[0], instance_of(unicode))
+
+    @unittest.test
+    def registering_same_name_replaces_codec(self):
+        ''' codec registered again under the same name replaces the former '''
+        count  = len(springnote.json_codecs)
+        codec = springnote.register_json_codec('counting', None, None)
+        assert_that(len(springnote.json_codecs), is_(count))
+        assert_that(springnote.json_codec('counting'), is_(codec))
+
+class AsyncSpringnoteTestCase(unittest.TestCase):
+    def setUp(self):
+        self.response = Mock()
+        self.response.status = 200
+        stub_headers(self.response)
+        self.response.read = lambda: '[]'
+        self.sn = springnote.AsyncSpringnote(workers=2)
+        self.sn.springnote_request = lambda *args, **kwarg: self.response
+
+    def tearDown(self):
+        self.sn.close()
+
+    @unittest.test
+    def request_methods_return_future(self):
+        ''' sn.list_pages() returns a Future of Page.list(sn) '''
+        future = self.sn.list_pages()
+        assert_that(future, instance_of(springnote.Future))
+        assert_that(future.result(), is_([]))
+
+    @unittest.test
+    def exception_is_raised_from_result(self):
+        ''' error response is raised when the result of the future is asked '''
+        self.response.status = 404
+        future = self.sn.get_page(id=123)
+        should_raise(springnote.SpringnoteError.Response, when=future.result)
+        assert_that(future.exception(), instance_of(springnote.SpringnoteError.Response))
+
+    @unittest.test
+    def request_methods_of_pages_return_future(self):
+        ''' page.list_attachments() of a page built with AsyncSpringnote returns a Future '''
+        page = springnote.Page(self.sn, id=123)
+        future = page.list_attachments()
+        assert_that(future, instance_of(springnote.Future))
+        assert_that(future.result(), is_([]))
+
+    @unittest.test
+    def request_methods_of_pages_block_in_workers(self):
+        ''' page.list_attachments() run by a worker returns the result itself '''
+        page = springnote.Page(self.sn, id=123)
+        assert_that(self.sn.submit(page.list_attachments).result(), is_([]))
+        sync_page = springnote.Page(springnote.Springnote(), id=123)
+        sync_page.auth.springnote_request = self.sn.springnote_request
+        assert_that(sync_page.list_attachments(), is_([]))
+
+    @unittest.test
+    def concurrency_controller_is_kept_and_sizes_workers(self):
+        ''' AsyncSpringnote(concurrency=controller) keeps the controller, with as many workers as it allows '''
+        controller = springnote.ConcurrencyController(max_limit=5)
+        sn = springnote.AsyncSpringnote(concurrency=controller)
+        try:
+            assert_that(sn.concurrency, is_(controller))
+            assert_that(sn.executor.workers, is_(5))
+        finally:
+            sn.close()
+        sn = springnote.AsyncSpringnote(concurrency=controller, workers=3)
+        try:
+            assert_that(sn.executor.workers, is_(3))
+        finally:
+            sn.close()
+
+class MapTestCase(unittest.TestCase):
+    def setUp(self):
+        self.sn = springnote.Springnote()
+
+    @unittest.test
+    def results_are_in_order_of_requests(self):
+        ''' sn.map(requests) returns futures in order of requests given '''
+        requests = [(lambda x: x * 2, (i,)) for i in range(10)]
+        results  = [f.result() for f in self.sn.map(requests, workers=3)]
+        assert_that(results, is_([i * 2 for i in range(10)]))
+
+    @unittest.test
+    def exception_does_not_stop_other_requests(self):
+        ''' exception raised by a request is kept in its future '''
+        def fail(): raise springnote.SpringnoteError.NoNetwork("down")
+        requests = [lambda: 1, fail, lambda: 3]
+        futures  = list(self.sn.map(requests, workers=2, ordered=False))
+        errors   = [f.exception() for f in futures if f.exception()]
+        assert_that(futures, has_length(3))
+        assert_that(errors,  has_length(1))
+        assert_that(errors[0], instance_of(springnote.SpringnoteError.NoNetwork))
+
 class SpringnoteBlackMagicTestCase(unittest.TestCase):
     def setUp(self):
         springnote.httplib = mock_module_httplib()
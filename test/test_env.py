@@ -133,11 +133,32 @@ def should_raise(exception, when):
         error_msg = 'expected %s to be raised but instead got %s:"%s"' % (exception, type(e), e)
         raise AssertionError, error_msg
 
+def stub_headers(response, headers=None):
+    ''' let mock response answer getheader() from given headers '''
+    headers = dict((k.lower(), v) for k, v in (headers or {}).iteritems())
+    response.getheader = lambda name, default=None: headers.get(name.lower(), default)
+    return response
+
 # callabla Mock
 class CMock(Mock):
     def __init__(self, *arg, **kwarg): 
         Mock.__init__(self, `(arg, kwarg)`)
     def __call__(self, *arg, **kwarg): return self
+    # the mock class makes itself as its instance
+    def __instancecheck__(self, instance): return instance is self
+
+class MockConnection(Mock):
+    ''' mock of httplib.HTTPConnection, connected as it sends a request '''
+    sock = None
+
+class SpringnoteCMock(CMock):
+    ''' mock class of Springnote, with options of a client built by default.
+    responses it returns are not compressed '''
+    options = vars(springnote.Springnote(compress=False))
+    def __init__(self, *arg, **kwarg):
+        CMock.__init__(self, *arg, **kwarg)
+        for name, value in self.options.iteritems():
+            setattr(self, name, value)
 
 def mock_class_Springnote():
     global original_class_Springnote
@@ -146,7 +167,7 @@ def mock_class_Springnote():
     host = springnote.HOST
 
     # mock
-    springnote.Springnote = CMock()
+    springnote.Springnote = SpringnoteCMock()
     springnote.HOST = host
 
     return springnote.Springnote